@@ -1,20 +1,46 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import folium
-from folium.plugins import HeatMap
+from folium.plugins import HeatMap, HeatMapWithTime
 from pathlib import Path
 import streamlit.components.v1 as components
-import unicodedata
-
-
-from data_loader import read_spreadsheet
+from streamlit_folium import st_folium
+import time
+
+
+from data_loader import (
+    read_spreadsheet,
+    read_spreadsheets,
+    COL_ORIGEM,
+    SUPPORTED_EXTENSIONS,
+    MemoryViewIO,
+    fingerprint,
+    measure_peak_memory,
+    peak_rss_bytes,
+    prepare_dataset,
+    FAIXAS_TEMPO,
+)
 from geo import (
     explode_cidades,
     load_city_coords_csv,
     load_cache,
     save_cache,
     geocode_missing,
+    norm_text_basic,
+    norm_uf,
+    GridIndex,
 )
+from snapshot import load_snapshot, snapshot_key
+from map_layers import (
+    load_geojson,
+    simplify_geojson,
+    join_features,
+    cumulative_frames,
+    CanvasPointLayer,
+    canvas_payload,
+)
+from rankings import METRICAS, rateio_receita, agregar, ranking, regiao
 import config
 
 LOGO_PATH = Path("assets/logo_oletv.png")
@@ -27,12 +53,6 @@ def col_exists(df: pd.DataFrame, name: str) -> bool:
     return name in df.columns
 
 
-def _norm_col(c: str) -> str:
-    c = str(c).replace("\n", " ").replace("\r", " ")
-    c = " ".join(c.split())
-    return c.strip()
-
-
 def _safe(v) -> str:
     if pd.isna(v):
         return ""
@@ -50,69 +70,60 @@ def _format_money(v) -> str:
         return str(v)
 
 
-def _format_date(v) -> str:
-    """Formata data para dd/mm/aaaa"""
-    if pd.isna(v) or v == "":
-        return ""
-    try:
-        d = pd.to_datetime(v, errors="coerce", dayfirst=True)
-        if pd.isna(d):
-            return ""
-        return d.strftime("%d/%m/%Y")
-    except Exception:
-        return str(v)
-
-
-def _format_tempo_contrato(dt_value) -> str:
-    """Retorna tempo desde a assinatura (ex: 1a 3m, 2m 12d)."""
-    if pd.isna(dt_value) or dt_value == "":
-        return ""
-    try:
-        dt = pd.to_datetime(dt_value, errors="coerce", dayfirst=True)
-        if pd.isna(dt):
-            return ""
-
-        today = pd.Timestamp.today().normalize()
-        dt = pd.Timestamp(dt).normalize()
-
-        if dt > today:
-            return "0d"
-
-        delta_days = (today - dt).days
-
-        years = delta_days // 365
-        rem = delta_days % 365
-        months = rem // 30
-        days = rem % 30
-
-        parts = []
-        if years > 0:
-            parts.append(f"{years}a")
-        if months > 0:
-            parts.append(f"{months}m")
-        if years == 0 and months == 0:
-            parts.append(f"{days}d")
-
-        return " ".join(parts).strip()
-    except Exception:
-        return ""
-
-
-def _norm_text_basic(s: str) -> str:
-    """Normaliza texto (remove acentos, lowercase, trim, espaços)."""
-    if s is None:
-        return ""
-    s = str(s)
-    s = unicodedata.normalize("NFKD", s)
-    s = "".join(ch for ch in s if not unicodedata.combining(ch))
-    s = s.lower().strip()
-    s = " ".join(s.split())
-    return s
-
-
-def _norm_uf(uf: str) -> str:
-    uf = _norm_text_basic(uf).upper()
-    return uf[:2] if uf else ""
+def _popup_campos(d: pd.DataFrame) -> pd.DataFrame:
+    """Campos do popup como texto (vetorizado), para a camada em canvas."""
+    def txt(col):
+        if col not in d.columns:
+            return pd.Series("", index=d.index)
+        return d[col].fillna("").astype(str).str.strip()
+
+    valor = d["VALOR MENSAL"].map(_format_money) if "VALOR MENSAL" in d.columns else txt("VALOR MENSAL")
+    cidades_col = "CIDADES ATENDIDAS" if "CIDADES ATENDIDAS" in d.columns else "CIDADES_ATENDIDAS"
+    return pd.DataFrame({
+        "ID_CLIENTE": d["ID_CLIENTE"],
+        "lat": d["lat"],
+        "lon": d["lon"],
+        "Cliente": txt("NOME FANTASIA"),
+        "UF/Cidade": txt("UF") + " / " + txt("CIDADE"),
+        "Valor mensal": valor,
+        "Vendedor": txt("VENDEDOR"),
+        "Assinatura": txt("ASSINATURA_FMT"),
+        "Tempo de contrato": txt("TEMPO_CONTRATO"),
+        "Cidades atendidas": txt(cidades_col),
+    }, index=d.index)
+
+
+@st.cache_resource(show_spinner="Processando planilha padrão...", max_entries=2)
+def _dataset_compartilhado(path: str, all_sheets: bool, key: str):
+    """
+    Planilha padrão processada uma vez por processo (snapshot Feather
+    memory-mapped) e compartilhada por todas as sessões - somente leitura.
+    `key` muda quando a planilha/coordenadas mudam.
+    """
+    return load_snapshot(path, all_sheets)
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _indice_coordenadas(chave: str, _coords: pd.DataFrame):
+    """
+    Índice espacial da tabela de coordenadas, montado uma vez por `chave`
+    (arquivo de coordenadas + nº de linhas). As linhas do mapa chegam ao
+    índice pela coluna COORD_ID, sem junção a cada rerun.
+    Devolve (índice, COORD_ID de cada ponto do índice).
+    """
+    ok = _coords["lat"].notna() & _coords["lon"].notna()
+    c = _coords[ok]
+    return GridIndex(c["lat"].to_numpy(dtype=float), c["lon"].to_numpy(dtype=float)), c["COORD_ID"].to_numpy(dtype=np.int64)
+
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def _malha_simplificada(path: str, mtime: float, zoom: int) -> dict:
+    """
+    GeoJSON simplificado para o zoom (cache por arquivo/versão/zoom).
+    Compartilhado sem cópia entre reruns e sessões: somente leitura
+    (join_features copia só as propriedades).
+    """
+    return simplify_geojson(load_geojson(path), zoom)
 
 
 # -----------------------------
@@ -129,38 +140,81 @@ st.sidebar.title("Mapa de calor")
 st.title("Mapa de calor de clientes/provedores")
 
 
-from io import BytesIO
-
-# Upload (Cloud-friendly)
-up = st.file_uploader(
-    "Envie a planilha (.xls/.xlsx) (no Streamlit Cloud isso é obrigatório)",
-    type=["xls", "xlsx", "xlsm"],
+# Upload (Cloud-friendly) - aceita várias planilhas (ex.: uma por equipe regional)
+ups = st.file_uploader(
+    "Envie a planilha (.xlsx/.xls/.csv/.parquet/.feather) (no Streamlit Cloud isso é obrigatório)",
+    type=SUPPORTED_EXTENSIONS,
+    accept_multiple_files=True,
 )
+todas_abas = st.checkbox("Ler todas as abas (ex.: uma aba por UF)", value=False)
 
-if up is None:
+if not ups:
     # tenta usar padrão local (funciona localmente, mas no Cloud geralmente não existe)
     if getattr(config, "DEFAULT_SPREADSHEET_PATH", None) and Path(config.DEFAULT_SPREADSHEET_PATH).exists():
-        df = read_spreadsheet(config.DEFAULT_SPREADSHEET_PATH)
+        df, df_exp_shared = _dataset_compartilhado(
+            config.DEFAULT_SPREADSHEET_PATH,
+            todas_abas,
+            snapshot_key(config.DEFAULT_SPREADSHEET_PATH, todas_abas),
+        )
         st.caption(f"Planilha carregada: `{config.DEFAULT_SPREADSHEET_PATH}` | Linhas: {len(df)}")
     else:
         st.info("Envie uma planilha para começar (no Cloud não existe arquivo padrão local).")
         st.stop()
 else:
+    df_exp_shared = None
     # ✅ NÃO salva no disco: evita conflito entre usuários/sessões no Cloud
-    data = BytesIO(up.getvalue())
-    df = read_spreadsheet(data)
-    st.caption(f"Planilha carregada: `{up.name}` | Linhas: {len(df)}")
-
-
-# Normaliza nomes das colunas (resolve VALOR\nMENSAL etc.)
-df.columns = [_norm_col(c) for c in df.columns]
-
-# Coluna datetime para filtro (ASSINATURA CONTRATO)
-if col_exists(df, "ASSINATURA CONTRATO"):
-    df["ASSINATURA_DT"] = pd.to_datetime(df["ASSINATURA CONTRATO"], errors="coerce", dayfirst=True)
-else:
-    df["ASSINATURA_DT"] = pd.NaT
-
+    # O upload fica em cache na sessão: reruns (mudança de filtro) não copiam
+    # nem reprocessam o arquivo. Chave rápida = ids do uploader; se mudar,
+    # o hash do conteúdo ainda evita reprocessar o mesmo arquivo reenviado.
+    upload_key = (tuple((u.file_id, u.name, u.size) for u in ups), todas_abas)
+    cache = st.session_state.get("_upload_cache")
+
+    if cache is None or cache["key"] != upload_key:
+        # getvalue() devolve os bytes do uploader sem copiar; memoryview idem
+        views = [(u.name, memoryview(u.getvalue())) for u in ups]
+        fp = fingerprint(*(v for _, v in views)) + (":abas" if todas_abas else "")
+
+        if cache is not None and cache["fp"] == fp:
+            cache["key"] = upload_key
+        else:
+            if len(views) == 1 and not todas_abas:
+                nome, view = views[0]
+                ler, args = read_spreadsheet, (MemoryViewIO(view),)
+                kwargs = {"name": nome}
+            else:
+                # várias planilhas/abas: leitura em paralelo (process pool) + coluna ORIGEM
+                ler, args, kwargs = read_spreadsheets, (views,), {"all_sheets": todas_abas}
+
+            total_bytes = sum(len(v) for _, v in views)
+            pico = None
+            if total_bytes >= config.UPLOAD_GRANDE_MB * 1024 * 1024:
+                df_up, pico = measure_peak_memory(ler, *args, **kwargs)
+            else:
+                df_up = ler(*args, **kwargs)
+            df_up = prepare_dataset(df_up)
+
+            cache = {"key": upload_key, "fp": fp, "df": df_up, "bytes": total_bytes, "pico": pico}
+        st.session_state["_upload_cache"] = cache
+
+    df = cache["df"]
+    nomes = ", ".join(f"`{u.name}`" for u in ups)
+    st.caption(f"Planilha carregada: {nomes} | Linhas: {len(df)}")
+
+    if cache["pico"] is not None:
+        pico = cache["pico"]
+        partes = []
+        if pico["rss"] is not None:
+            partes.append(f"pico RSS do processo +{pico['rss'] / 2**20:.0f} MB")
+        if pico["arrow"]:
+            partes.append(f"Arrow {pico['arrow'] / 2**20:.0f} MB")
+        if pico["workers"]:
+            partes.append(f"maior worker {pico['workers'] / 2**20:.0f} MB")
+        rss = peak_rss_bytes()
+        if rss:
+            partes.append(f"pico RSS total {rss / 2**20:.0f} MB")
+        st.caption(f"Arquivo grande ({cache['bytes'] / 2**20:.0f} MB) - memória na leitura: " + " | ".join(partes))
+
+# Colunas já normalizadas e ASSINATURA_DT criada (data_loader.prepare_dataset)
 #st.caption(f"Planilha carregada: `{planilha_path}` | Linhas: {len(df)}")
 
 # -----------------------------
@@ -168,25 +222,27 @@ else:
 # -----------------------------
 st.sidebar.subheader("Filtros (cliente)")
 
-df_f = df.copy()
+# df pode ser compartilhado entre sessões: os filtros só montam uma máscara
+# e o recorte (df_f) é feito uma vez no fim - sem filtro, nem isso
+mask = pd.Series(True, index=df.index)
 
 # Filtro por nome do cliente (contém)
 st.sidebar.markdown("---")
 st.sidebar.subheader("Buscar Cliente")
 busca_nome = st.sidebar.text_input("Nome do cliente", placeholder="Digite parte do nome...")
 
-if busca_nome and col_exists(df_f, "NOME FANTASIA"):
-    df_f = df_f[
-        df_f["NOME FANTASIA"]
+if busca_nome and col_exists(df, "NOME FANTASIA"):
+    mask &= (
+        df["NOME FANTASIA"]
         .astype(str)
         .str.contains(busca_nome, case=False, na=False)
-    ]
+    )
 
 # Filtro por período (slider) - sem RangeError quando min==max
 st.sidebar.markdown("---")
 st.sidebar.subheader("Período de Ativação (Assinatura)")
 
-datas_validas = df_f["ASSINATURA_DT"].dropna() if col_exists(df_f, "ASSINATURA_DT") else pd.Series([], dtype="datetime64[ns]")
+datas_validas = df.loc[mask, "ASSINATURA_DT"].dropna() if col_exists(df, "ASSINATURA_DT") else pd.Series([], dtype="datetime64[ns]")
 
 data_inicio, data_fim = None, None
 if not datas_validas.empty:
@@ -205,27 +261,41 @@ if not datas_validas.empty:
             format="DD/MM/YYYY",
         )
 
-    # aplica filtro
-    df_f = df_f[df_f["ASSINATURA_DT"].notna()].copy()
-    df_f = df_f[
-        (df_f["ASSINATURA_DT"].dt.date >= data_inicio) &
-        (df_f["ASSINATURA_DT"].dt.date <= data_fim)
-    ]
+    # aplica filtro (datas vazias ficam de fora)
+    mask &= (
+        (df["ASSINATURA_DT"] >= pd.Timestamp(data_inicio)) &
+        (df["ASSINATURA_DT"] < pd.Timestamp(data_fim) + pd.Timedelta(days=1))
+    )
 else:
     st.sidebar.caption("Sem datas válidas para filtrar (ASSINATURA CONTRATO).")
 
+# Filtro por tempo de contrato (faixas calculadas uma vez na carga)
+if col_exists(df, "FAIXA_TEMPO"):
+    faixa_opts = [rot for _, rot in FAIXAS_TEMPO if (df.loc[mask, "FAIXA_TEMPO"] == rot).any()]
+    faixas = st.sidebar.multiselect("Tempo de contrato", faixa_opts)
+    if faixas:
+        mask &= df["FAIXA_TEMPO"].isin(faixas)
+
 # Outros filtros
-if col_exists(df_f, config.COL_VENDEDOR):
-    vend_opts = sorted(df_f[config.COL_VENDEDOR].dropna().unique())
+if col_exists(df, config.COL_VENDEDOR):
+    vend_opts = sorted(df.loc[mask, config.COL_VENDEDOR].dropna().unique())
     vendedor = st.sidebar.multiselect("VENDEDOR", vend_opts)
     if vendedor:
-        df_f = df_f[df_f[config.COL_VENDEDOR].isin(vendedor)]
+        mask &= df[config.COL_VENDEDOR].isin(vendedor)
 
-if col_exists(df_f, config.COL_UF_CLIENTE):
-    uf_opts = sorted(df_f[config.COL_UF_CLIENTE].dropna().unique())
+if col_exists(df, config.COL_UF_CLIENTE):
+    uf_opts = sorted(df.loc[mask, config.COL_UF_CLIENTE].dropna().unique())
     uf_cli = st.sidebar.multiselect("UF (cadastro)", uf_opts)
     if uf_cli:
-        df_f = df_f[df_f[config.COL_UF_CLIENTE].isin(uf_cli)]
+        mask &= df[config.COL_UF_CLIENTE].isin(uf_cli)
+
+if col_exists(df, COL_ORIGEM):
+    origem_opts = sorted(df.loc[mask, COL_ORIGEM].dropna().unique())
+    origem = st.sidebar.multiselect("Origem (arquivo/aba)", origem_opts)
+    if origem:
+        mask &= df[COL_ORIGEM].isin(origem)
+
+df_f = df if mask.all() else df[mask]
 
 
 # -----------------------------
@@ -241,15 +311,17 @@ modo_bolinhas = st.sidebar.radio(
 )
 
 MOSTRAR_PONTOS = st.sidebar.checkbox("Mostrar pontos clicáveis", True)
-#SEMPRE_TODAS = st.sidebar.checkbox("Sempre mostrar todas", True)
+SEMPRE_TODAS = st.sidebar.checkbox("Sempre mostrar todas", True)
 
 # -----------------------------
 # Coordenadas (cache)
 # -----------------------------
 if Path(config.CIDADES_CSV).exists():
-    coords_df = load_city_coords_csv(config.CIDADES_CSV)
+    coords_path = config.CIDADES_CSV
+    coords_df = load_city_coords_csv(coords_path)
 else:
-    coords_df = load_cache(config.CIDADES_CACHE_CSV)
+    coords_path = config.CIDADES_CACHE_CSV
+    coords_df = load_cache(coords_path)
 
 # Geocoding opcional
 st.sidebar.markdown("---")
@@ -266,23 +338,33 @@ if modo_bolinhas in ("Cidades atendidas", "Ambos"):
         st.error(f"Coluna `{config.COL_CIDADES_ATENDIDAS}` não encontrada.")
         st.stop()
 
-    df_exp = explode_cidades(df_f, col=config.COL_CIDADES_ATENDIDAS)
+    if df_exp_shared is not None:
+        # snapshot compartilhado: máscara das cidades dos clientes filtrados
+        # (ID_CLIENTE é a posição do cliente em df); o recorte fica para o fim
+        df_exp = df_exp_shared
+        mask_exp = mask.to_numpy()[df_exp["ID_CLIENTE"].to_numpy()]
+    else:
+        df_exp = explode_cidades(df_f, col=config.COL_CIDADES_ATENDIDAS)
+        mask_exp = np.ones(len(df_exp), dtype=bool)
+    if "RECEITA" not in df_exp.columns:
+        # rateio antes dos filtros de atendimento: a fração de cada cidade não muda
+        df_exp = df_exp.assign(RECEITA=rateio_receita(df_exp))
 
     # filtros (atendimento)
     st.sidebar.markdown("---")
     st.sidebar.subheader("Filtros (atendimento)")
 
-    ufs_atend = sorted(df_exp["UF_ATENDIDA"].dropna().unique())
-    cids_atend = sorted(df_exp["CIDADE_ATENDIDA"].dropna().unique())
+    ufs_atend = sorted(df_exp.loc[mask_exp, "UF_ATENDIDA"].dropna().unique())
+    cids_atend = sorted(df_exp.loc[mask_exp, "CIDADE_ATENDIDA"].dropna().unique())
 
     uf_atendida = st.sidebar.multiselect("UF atendida", ufs_atend)
     cidade_atendida = st.sidebar.multiselect("Cidade atendida", cids_atend)
 
-    df_exp_f = df_exp.copy()
     if uf_atendida:
-        df_exp_f = df_exp_f[df_exp_f["UF_ATENDIDA"].isin(uf_atendida)]
+        mask_exp &= df_exp["UF_ATENDIDA"].isin(uf_atendida).to_numpy()
     if cidade_atendida:
-        df_exp_f = df_exp_f[df_exp_f["CIDADE_ATENDIDA"].isin(cidade_atendida)]
+        mask_exp &= df_exp["CIDADE_ATENDIDA"].isin(cidade_atendida).to_numpy()
+    df_exp_f = df_exp if mask_exp.all() else df_exp[mask_exp]
 
     # geocode opcional (atendidas)
     if allow_geocode:
@@ -291,25 +373,35 @@ if modo_bolinhas in ("Cidades atendidas", "Ambos"):
         save_cache(config.CIDADES_CACHE_CSV, coords_df)
         st.sidebar.success("Cache atualizado")
 
-    df_att = df_exp_f.merge(coords_df, on=["cidade_norm", "uf_norm"], how="left")
+    if allow_geocode or not col_exists(df_exp_f, "lat"):
+        df_att = df_exp_f.drop(columns=["lat", "lon", "COORD_ID"], errors="ignore").merge(
+            coords_df, on=["cidade_norm", "uf_norm"], how="left"
+        )
+    else:
+        # coordenadas já vieram no snapshot
+        df_att = df_exp_f
     if "PESO" not in df_att.columns:
-        df_att["PESO"] = 1
+        df_att = df_att.assign(PESO=1)
 
 # B) Cidade base do cliente (CIDADE/UF do cadastro)
 df_base = None
 if modo_bolinhas in ("Cidade base do cliente", "Ambos"):
-    df_base = df_f.copy()
-
     # tenta pegar colunas padrão
-    col_uf = config.COL_UF_CLIENTE if col_exists(df_base, config.COL_UF_CLIENTE) else "UF"
-    col_cidade = "CIDADE" if col_exists(df_base, "CIDADE") else None
+    col_uf = config.COL_UF_CLIENTE if col_exists(df_f, config.COL_UF_CLIENTE) else "UF"
+    col_cidade = "CIDADE" if col_exists(df_f, "CIDADE") else None
 
-    if not col_cidade or not col_exists(df_base, col_uf):
+    if not col_cidade or not col_exists(df_f, col_uf):
         st.warning("Não encontrei colunas de cidade/UF do cliente (CIDADE e UF). Vou ignorar 'Cidade base'.")
-        df_base = None
+    elif df_exp_shared is not None and not allow_geocode and col_exists(df_f, "lat"):
+        # snapshot compartilhado: coordenadas, ID_CLIENTE, PESO e RECEITA da
+        # cidade base já vêm na tabela - sem cópia nem merge por sessão
+        df_base = df_f
     else:
-        df_base["uf_norm"] = df_base[col_uf].apply(_norm_uf)
-        df_base["cidade_norm"] = df_base[col_cidade].apply(_norm_text_basic)
+        df_base = df_f.drop(columns=["lat", "lon", "COORD_ID"], errors="ignore")
+        df_base = df_base.assign(
+            uf_norm=df_base[col_uf].apply(norm_uf),
+            cidade_norm=df_base[col_cidade].apply(norm_text_basic),
+        )
 
         # geocode opcional (base)
         if allow_geocode:
@@ -320,8 +412,12 @@ if modo_bolinhas in ("Cidade base do cliente", "Ambos"):
             save_cache(config.CIDADES_CACHE_CSV, coords_df)
             st.sidebar.success("Cache atualizado")
 
+        # ID_CLIENTE antes do merge (que refaz o índice): posição do cliente em df,
+        # como em explode_cidades - mesmo com cidade repetida em coords_df
+        df_base["ID_CLIENTE"] = df_base.index
         df_base = df_base.merge(coords_df, on=["cidade_norm", "uf_norm"], how="left")
         df_base["PESO"] = 1
+        df_base["RECEITA"] = rateio_receita(df_base)
 
 # Combina para mapa/heat
 dfs = [d for d in [df_att, df_base] if d is not None]
@@ -329,7 +425,8 @@ if not dfs:
     st.info("Nenhum dado para exibir com os filtros atuais.")
     st.stop()
 
-df_geo = pd.concat(dfs, ignore_index=True)
+# um único DataFrame: usa direto (concat copiaria tudo)
+df_geo = dfs[0] if len(dfs) == 1 else pd.concat(dfs, ignore_index=True)
 
 faltando = int(df_geo["lat"].isna().sum())
 st.write(f"Registros: **{len(df_geo)}** | Sem coordenada: **{faltando}**")
@@ -351,86 +448,180 @@ if faltando > 0:
 # -----------------------------
 st.markdown("### Rankings e gráficos")
 
-rank_source = df_att if df_att is not None else df_base
-rank_base = rank_source.dropna(subset=["lat", "lon"]).copy()
+# rankings não dependem de coordenada: cidades ainda sem lat/lon também
+# entram nas somas de PESO e RECEITA (e no ranking de vendedores)
+rank_base = df_att if df_att is not None else df_base
 
 # se tiver UF_ATENDIDA usa isso, senão usa UF do cadastro
 uf_rank_col = "UF_ATENDIDA" if "UF_ATENDIDA" in rank_base.columns else ("UF" if "UF" in rank_base.columns else None)
 
-# Top 10 cidades (se atendida, usa CIDADE_ATENDIDA; senão CIDADE)
-st.markdown("#### Top 10 cidades (por quantidade)")
+metrica_label = st.radio("Métrica dos rankings", list(METRICAS), horizontal=True)
+metrica = METRICAS[metrica_label]
+metrica_nome = metrica_label.split(" (")[0].lower()
+if metrica == "RECEITA" and not col_exists(rank_base, "VALOR MENSAL"):
+    st.caption("Sem coluna VALOR MENSAL: receita aparece zerada.")
+
 cidade_rank_col = "CIDADE_ATENDIDA" if "CIDADE_ATENDIDA" in rank_base.columns else ("CIDADE" if "CIDADE" in rank_base.columns else None)
 
+# Top 10 cidades (se atendida, usa CIDADE_ATENDIDA; senão CIDADE)
+st.markdown(f"#### Top 10 cidades (por {metrica_nome})")
 if uf_rank_col and cidade_rank_col:
     top10_cidades = (
-        rank_base.groupby([uf_rank_col, cidade_rank_col], as_index=False)
-        .size()
-        .sort_values("size", ascending=False)
-        .head(10)
-        .rename(columns={"size": "QTDE", uf_rank_col: "UF", cidade_rank_col: "CIDADE"})
+        ranking(rank_base, [uf_rank_col, cidade_rank_col], metrica, k=10)
+        .rename(columns={uf_rank_col: "UF", cidade_rank_col: "CIDADE"})
     )
-    st.dataframe(top10_cidades[["UF", "CIDADE", "QTDE"]], use_container_width=True)
+    top10_cidades["RECEITA"] = top10_cidades["RECEITA"].round(2)
+    st.dataframe(top10_cidades[["UF", "CIDADE", "QTDE", "PESO", "RECEITA"]], use_container_width=True)
 else:
     st.caption("Sem colunas suficientes para Top 10 cidades.")
 
+# Top 10 vendedores
+st.markdown(f"#### Top 10 vendedores (por {metrica_nome})")
+if col_exists(rank_base, config.COL_VENDEDOR):
+    # quantidade do vendedor = clientes (QTDE contaria cidades atendidas)
+    metrica_vend = "CLIENTES" if metrica == "QTDE" else metrica
+    top10_vend = ranking(rank_base, [config.COL_VENDEDOR], metrica_vend, k=10, clientes=True)
+    top10_vend["RECEITA"] = top10_vend["RECEITA"].round(2)
+    top10_vend = top10_vend.rename(columns={"QTDE": "CIDADES"})
+    st.dataframe(top10_vend[[config.COL_VENDEDOR, "CLIENTES", "CIDADES", "PESO", "RECEITA"]], use_container_width=True)
+else:
+    st.caption(f"Sem coluna {config.COL_VENDEDOR} para ranking de vendedores.")
+
 # Gráfico por UF
-st.markdown("#### Atendimentos por UF (quantidade)")
+st.markdown(f"#### Atendimentos por UF (por {metrica_nome})")
 if uf_rank_col:
-    por_uf = (
-        rank_base.groupby(uf_rank_col, as_index=False)
-        .size()
-        .sort_values("size", ascending=False)
-        .rename(columns={"size": "QTDE", uf_rank_col: "UF"})
-    )
-    st.bar_chart(por_uf.set_index("UF")["QTDE"])
+    por_uf = ranking(rank_base, [uf_rank_col], metrica).rename(columns={uf_rank_col: "UF"})
+    st.bar_chart(por_uf.set_index("UF")[metrica])
 else:
     st.caption("Sem coluna UF para gráfico.")
 
 # Gráfico por Região
-st.markdown("#### Atendimentos por Região (quantidade)")
-UF_PARA_REGIAO = {
-    "AC": "Norte", "AP": "Norte", "AM": "Norte", "PA": "Norte",
-    "RO": "Norte", "RR": "Norte", "TO": "Norte",
-    "AL": "Nordeste", "BA": "Nordeste", "CE": "Nordeste", "MA": "Nordeste",
-    "PB": "Nordeste", "PE": "Nordeste", "PI": "Nordeste", "RN": "Nordeste", "SE": "Nordeste",
-    "DF": "Centro-Oeste", "GO": "Centro-Oeste", "MT": "Centro-Oeste", "MS": "Centro-Oeste",
-    "ES": "Sudeste", "MG": "Sudeste", "RJ": "Sudeste", "SP": "Sudeste",
-    "PR": "Sul", "RS": "Sul", "SC": "Sul",
-}
-
+st.markdown(f"#### Atendimentos por Região (por {metrica_nome})")
 if uf_rank_col:
-    tmp = rank_base.copy()
-    tmp["REGIAO"] = tmp[uf_rank_col].astype(str).str.upper().map(UF_PARA_REGIAO).fillna("Desconhecida")
-    por_regiao = (
-        tmp.groupby("REGIAO", as_index=False)
-        .size()
-        .sort_values("size", ascending=False)
-        .rename(columns={"size": "QTDE"})
-    )
-    st.bar_chart(por_regiao.set_index("REGIAO")["QTDE"])
+    por_regiao = ranking(rank_base.assign(REGIAO=regiao(rank_base[uf_rank_col])), ["REGIAO"], metrica)
+    st.bar_chart(por_regiao.set_index("REGIAO")[metrica])
 else:
     st.caption("Sem coluna UF para região.")
 
+# Gráfico por tempo de contrato (faixas em ordem)
+st.markdown(f"#### Atendimentos por tempo de contrato (por {metrica_nome})")
+if col_exists(rank_base, "FAIXA_TEMPO") and rank_base["FAIXA_TEMPO"].notna().any():
+    por_faixa = agregar(rank_base, ["FAIXA_TEMPO"], observed=False).sort_values("FAIXA_TEMPO")
+    st.bar_chart(por_faixa.set_index("FAIXA_TEMPO")[metrica])
+else:
+    st.caption("Sem datas de assinatura para tempo de contrato.")
+
 # -----------------------------
 # MAPA
 # -----------------------------
 st.markdown("### Mapa")
 
-df_map = df_geo.dropna(subset=["lat", "lon"]).copy()
+tem_coord = df_geo["lat"].notna() & df_geo["lon"].notna()
+df_map = df_geo if tem_coord.all() else df_geo[tem_coord]
 
 zoom = st.sidebar.slider("Zoom inicial", 3, 12, 4)
 
+# Coroplético: uma área por UF/município (tamanho do mapa não cresce com o nº de clientes)
+# Linha do tempo: heatmap acumulado por mês de assinatura, animado no navegador
+modo_mapa = st.sidebar.radio(
+    "Modo do mapa",
+    ["Pontos e heatmap", "Coroplético por UF", "Coroplético por município", "Linha do tempo (assinatura)"],
+    index=0,
+)
+
 # limite opcional (performance)
 if not SEMPRE_TODAS:
     LIMITE_PONTOS = st.sidebar.slider("Limite de bolinhas", 100, 5000, 800, 100)
 else:
     LIMITE_PONTOS = len(df_map)
 
+# -----------------------------
+# Consulta por raio (índice espacial)
+# -----------------------------
+st.sidebar.markdown("---")
+st.sidebar.subheader("Consulta por raio")
+
+centro_raio = st.sidebar.radio("Centro da busca", ["Desligada", "Cidade", "Clique no mapa"], index=0)
+raio_centro, raio_km, raio_res = None, None, None
+
+if centro_raio != "Desligada" and uf_rank_col and cidade_rank_col and not df_map.empty:
+    raio_km = st.sidebar.slider("Raio (km)", 5, 1000, 100, 5)
+
+    if centro_raio == "Cidade":
+        locais = (
+            df_map[[cidade_rank_col, uf_rank_col, "lat", "lon"]]
+            .drop_duplicates(subset=[cidade_rank_col, uf_rank_col])
+            .sort_values([uf_rank_col, cidade_rank_col])
+        )
+        rotulos = (locais[cidade_rank_col].astype(str) + "/" + locais[uf_rank_col].astype(str)).tolist()
+        escolha = st.sidebar.selectbox("Cidade", rotulos)
+        if escolha:
+            loc = locais.iloc[rotulos.index(escolha)]
+            raio_centro = (float(loc["lat"]), float(loc["lon"]))
+    else:
+        # último clique no mapa (valor do componente st_folium da execução anterior)
+        clique = (st.session_state.get("mapa") or {}).get("last_clicked")
+        if clique:
+            raio_centro = (float(clique["lat"]), float(clique["lng"]))
+        else:
+            st.sidebar.caption("Clique no mapa para definir o centro.")
+
+if raio_centro is not None:
+    # índice das coordenadas (uma vez por tabela); geocoding acrescenta linhas e muda a chave
+    coords_mtime = Path(coords_path).stat().st_mtime_ns if Path(coords_path).exists() else 0
+    indice, ids_indice = _indice_coordenadas(f"{coords_path}:{coords_mtime}:{len(coords_df)}", coords_df)
+
+    t0 = time.perf_counter()
+    pos, dist = indice.query_radius(raio_centro[0], raio_centro[1], raio_km)
+    # distância por COORD_ID -> distância por linha do mapa
+    dist_coord = np.full(len(coords_df), np.inf)
+    dist_coord[ids_indice[pos]] = dist
+    dist_linha = dist_coord[df_map["COORD_ID"].to_numpy(dtype=np.int64)]
+    sel = np.flatnonzero(dist_linha <= raio_km)
+    sel = sel[np.argsort(dist_linha[sel], kind="stable")]
+    raio_res = df_map.iloc[sel].assign(DIST_KM=dist_linha[sel])
+
+    # PESO soma todas as cidades atendidas no raio; VALOR MENSAL conta o cliente uma vez
+    agg = {"CIDADES": ("PESO", "size"), "PESO": ("PESO", "sum"), "DIST_KM": ("DIST_KM", "min")}
+    if col_exists(raio_res, "VALOR MENSAL"):
+        agg["VALOR MENSAL"] = ("VALOR MENSAL", "first")
+    chave = ["ID_CLIENTE", "NOME FANTASIA"] if col_exists(raio_res, "NOME FANTASIA") else ["ID_CLIENTE"]
+    prov_raio = raio_res.groupby(chave, as_index=False).agg(**agg)
+    if "VALOR MENSAL" in prov_raio.columns:
+        prov_raio["VALOR MENSAL"] = pd.to_numeric(prov_raio["VALOR MENSAL"], errors="coerce")
+    prov_raio = prov_raio.sort_values(["PESO", "DIST_KM"], ascending=[False, True])
+    t_ms = (time.perf_counter() - t0) * 1000
+
+    st.markdown(
+        f"#### Provedores num raio de {raio_km} km "
+        f"({raio_centro[0]:.4f}, {raio_centro[1]:.4f})"
+    )
+    valor_total = prov_raio["VALOR MENSAL"].sum() if "VALOR MENSAL" in prov_raio.columns else None
+    st.write(
+        f"Provedores: **{len(prov_raio)}** | PESO total: **{prov_raio['PESO'].sum():g}**"
+        + (f" | Valor mensal total: **{_format_money(valor_total)}**" if valor_total is not None else "")
+        + f" | Consulta: {t_ms:.1f} ms"
+    )
+    st.dataframe(
+        prov_raio.drop(columns=["ID_CLIENTE"]).round({"DIST_KM": 1}),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+# muitos pontos: desenha no canvas (um <canvas> em vez de um SVG por bolinha)
+# e envia os dados em arrays compactos
+ALTO_VOLUME = (
+    MOSTRAR_PONTOS
+    and modo_mapa == "Pontos e heatmap"
+    and min(len(df_map), LIMITE_PONTOS) > config.LIMITE_CANVAS
+)
+
 m = folium.Map(
     location=[-14.2, -51.9],
     zoom_start=zoom,
     tiles="OpenStreetMap",
     control_scale=True,
+    prefer_canvas=ALTO_VOLUME,
 )
 
 folium.TileLayer("CartoDB positron", show=False).add_to(m)
@@ -439,9 +630,83 @@ folium.TileLayer("CartoDB positron", show=False).add_to(m)
 folium.map.CustomPane("heatmap", z_index=200).add_to(m)
 folium.map.CustomPane("markers", z_index=650).add_to(m)
 
+# Linha do tempo: todos os quadros vão num único layer (play sem rerun)
+if modo_mapa == "Linha do tempo (assinatura)":
+    frames, frame_labels = cumulative_frames(df_map)
+    if frames:
+        st.caption(f"Linha do tempo: {len(frames)} meses ({frame_labels[0]} a {frame_labels[-1]})")
+        HeatMapWithTime(
+            frames,
+            index=frame_labels,
+            name="Linha do tempo",
+            radius=18,
+            min_opacity=0.35,
+            max_opacity=0.8,
+            auto_play=False,
+        ).add_to(m)
+    else:
+        st.caption("Sem datas de assinatura válidas para a linha do tempo.")
+
+# Coroplético (agregados do ranking juntados às malhas)
+if modo_mapa.startswith("Coroplético"):
+    por_municipio = modo_mapa == "Coroplético por município"
+    malha_path = config.GEOJSON_MUNICIPIOS if por_municipio else config.GEOJSON_UF
+
+    if not Path(malha_path).exists():
+        st.warning(
+            f"Malha `{malha_path}` não encontrada. "
+            "Gere com `python tools/baixar_malhas.py` (precisa internet)."
+        )
+    elif not uf_rank_col or (por_municipio and not cidade_rank_col):
+        st.caption("Sem colunas suficientes para o mapa coroplético.")
+    else:
+        malha = _malha_simplificada(malha_path, Path(malha_path).stat().st_mtime, zoom)
+
+        if por_municipio:
+            agg_area = rank_base.groupby([uf_rank_col, cidade_rank_col], as_index=False).size()
+            agg_area["_key"] = [
+                f"{norm_text_basic(c)}/{norm_uf(u)}"
+                for u, c in zip(agg_area[uf_rank_col], agg_area[cidade_rank_col])
+            ]
+            agg_area = agg_area.groupby("_key", as_index=False)["size"].sum()
+
+            def area_key(props):
+                nome = norm_text_basic(props.get(config.GEOJSON_MUN_NOME_PROP, ""))
+                return f"{nome}/{norm_uf(props.get(config.GEOJSON_MUN_UF_PROP, ''))}"
+            campos, rotulos = [config.GEOJSON_MUN_NOME_PROP, config.GEOJSON_MUN_UF_PROP, "QTDE"], ["Município", "UF", "Qtde"]
+        else:
+            agg_area = rank_base.groupby(uf_rank_col, as_index=False).size()
+            agg_area["_key"] = agg_area[uf_rank_col].apply(norm_uf)
+            agg_area = agg_area.groupby("_key", as_index=False)["size"].sum()
+
+            def area_key(props):
+                return norm_uf(props.get(config.GEOJSON_UF_PROP, ""))
+            campos, rotulos = [config.GEOJSON_UF_PROP, "QTDE"], ["UF", "Qtde"]
+
+        agg_area = agg_area.rename(columns={"size": "QTDE"})
+        valores = {k: {"QTDE": int(q)} for k, q in zip(agg_area["_key"], agg_area["QTDE"])}
+        areas = join_features(malha, area_key, valores)
+        st.caption(f"Áreas no mapa: {len(areas['features'])} (de {len(agg_area)} com atendimento)")
+
+        if areas["features"]:
+            choro = folium.Choropleth(
+                geo_data=areas,
+                data=agg_area,
+                columns=["_key", "QTDE"],
+                key_on="feature.properties._key",
+                fill_color="YlOrRd",
+                fill_opacity=0.75,
+                line_weight=0.5,
+                legend_name="Quantidade de atendimentos",
+                name="Coroplético",
+            )
+            choro.geojson.add_child(folium.GeoJsonTooltip(fields=campos, aliases=rotulos))
+            choro.add_to(m)
+
 # Heatmap
-pontos_heat = df_map[["lat", "lon", "PESO"]].values.tolist()
-st.caption(f"Pontos no heatmap: {len(pontos_heat)}")
+pontos_heat = df_map[["lat", "lon", "PESO"]].values.tolist() if modo_mapa == "Pontos e heatmap" else []
+if modo_mapa == "Pontos e heatmap":
+    st.caption(f"Pontos no heatmap: {len(pontos_heat)}")
 
 if pontos_heat:
     HeatMap(
@@ -452,8 +717,27 @@ if pontos_heat:
         pane="heatmap",
     ).add_to(m)
 
-# Bolinhas com popup
-if MOSTRAR_PONTOS and not df_map.empty:
+# Bolinhas com popup (alto volume: camada em canvas)
+if ALTO_VOLUME:
+    campos = _popup_campos(df_map.head(LIMITE_PONTOS))
+    rotulos = [c for c in campos.columns if c not in ("ID_CLIENTE", "lat", "lon")]
+    pontos, registros = canvas_payload(
+        campos,
+        "ID_CLIENTE",
+        rotulos,
+        radius_fn=lambda n: 2 + np.minimum(10, n),
+    )
+    st.caption(f"Modo alto volume (canvas): {len(pontos)} pontos, {len(registros)} clientes")
+    CanvasPointLayer(
+        pontos,
+        registros,
+        labels=rotulos,
+        title="Provedores neste ponto:",
+        pane="markers",
+        name="Pontos",
+    ).add_to(m)
+
+elif MOSTRAR_PONTOS and modo_mapa == "Pontos e heatmap" and not df_map.empty:
 
     df_tt = df_map.head(LIMITE_PONTOS).copy()
     layer = folium.FeatureGroup("Pontos")
@@ -469,9 +753,9 @@ if MOSTRAR_PONTOS and not df_map.empty:
 
             valor = _format_money(row.get("VALOR MENSAL", ""))
             vendedor = _safe(row.get("VENDEDOR", ""))
-            assinatura_raw = row.get("ASSINATURA CONTRATO", "")
-            assinatura = _format_date(assinatura_raw)
-            tempo_contrato = _format_tempo_contrato(assinatura_raw)
+            # formatados uma vez por dataset (data_loader.add_tenure_columns)
+            assinatura = _safe(row.get("ASSINATURA_FMT", ""))
+            tempo_contrato = _safe(row.get("TEMPO_CONTRATO", ""))
 
             cidades_atend = _safe(row.get("CIDADES ATENDIDAS", row.get("CIDADES_ATENDIDAS", "")))
 
@@ -515,11 +799,38 @@ if MOSTRAR_PONTOS and not df_map.empty:
 if not df_map.empty:
     m.fit_bounds(df_map[["lat", "lon"]].values.tolist())
 
+# Destaque da consulta por raio
+if raio_res is not None:
+    layer_raio = folium.FeatureGroup("Consulta por raio")
+    folium.Circle(
+        location=list(raio_centro),
+        radius=raio_km * 1000,
+        color="#d62728",
+        fill=True,
+        fill_opacity=0.08,
+        pane="markers",
+    ).add_to(layer_raio)
+    for (lat, lon), g in raio_res.groupby(["lat", "lon"]):
+        folium.CircleMarker(
+            location=[lat, lon],
+            radius=4 + min(8, len(g)),
+            color="#d62728",
+            fill=True,
+            fill_opacity=0.9,
+            tooltip=f"{len(g)} provedor(es) | {g['DIST_KM'].min():.1f} km",
+            pane="markers",
+        ).add_to(layer_raio)
+    layer_raio.add_to(m)
+
 folium.LayerControl().add_to(m)
 
 # Render
-html_path = "mapa.html"
-m.save(html_path)
+if centro_raio == "Clique no mapa":
+    # componente interativo: devolve o último clique (centro da consulta por raio)
+    st_folium(m, key="mapa", height=650, use_container_width=True, returned_objects=["last_clicked"])
+else:
+    html_path = "mapa.html"
+    m.save(html_path)
 
-with open(html_path, "r", encoding="utf-8") as f:
-    components.html(f.read(), height=650, scrolling=True)
+    with open(html_path, "r", encoding="utf-8") as f:
+        components.html(f.read(), height=650, scrolling=True)
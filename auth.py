@@ -1,11 +1,38 @@
 import json
+import hmac
+import time
+import base64
+import hashlib
+import secrets
+import threading
+from collections import deque
 from pathlib import Path
+from typing import Optional
 from passlib.hash import pbkdf2_sha256
 import streamlit as st
 
 USERS_FILE = Path("users.json")
 LOGO_PATH = Path("assets/logo_oletv.png")
 
+# Arquivos de secrets do Streamlit (mudança invalida o cache de usuários)
+SECRETS_FILES = [Path(".streamlit/secrets.toml"), Path.home() / ".streamlit" / "secrets.toml"]
+
+# Sessão assinada (query param): recarregar a página não pede login de novo
+SESSION_PARAM = "sessao"
+SESSION_TTL_S = 12 * 3600
+
+# Limite de tentativas de login (evita força bruta gastando CPU no PBKDF2)
+MAX_TENTATIVAS = 5            # falhas seguidas por (cliente, usuário) antes de bloquear
+BLOQUEIO_BASE_S = 30          # bloqueio dobra a cada falha extra...
+BLOQUEIO_MAX_S = 15 * 60      # ...até este teto
+MAX_VERIFICACOES_MIN = 30     # verificações PBKDF2 por minuto (processo todo)
+
+_lock = threading.Lock()
+_users_cache = {"sig": None, "users": {}}
+_falhas = {}                  # (cliente, usuario) -> [falhas, bloqueado_ate]
+_verificacoes = deque()       # instantes das últimas verificações PBKDF2
+_chave_processo = secrets.token_bytes(32)
+
 
 def _load_users_from_users_json() -> dict:
     if USERS_FILE.exists():
@@ -60,16 +87,158 @@ def _load_users_from_secrets() -> dict:
     return {}
 
 
+def _users_signature() -> tuple:
+    sig = []
+    for p in [USERS_FILE] + SECRETS_FILES:
+        try:
+            stt = p.stat()
+            sig.append((str(p), stt.st_mtime_ns, stt.st_size))
+        except OSError:
+            sig.append((str(p), None, None))
+    return tuple(sig)
+
+
 def load_users() -> dict:
     """
     Prioridade:
       1) st.secrets (nuvem)
       2) users.json (local)
+
+    Cache no processo (todas as sessões); relido só quando users.json ou
+    secrets.toml mudam (mtime/tamanho).
     """
+    sig = _users_signature()
+    with _lock:
+        if _users_cache["sig"] == sig:
+            return _users_cache["users"]
+
     users = _load_users_from_secrets()
-    if users:
-        return users
-    return _load_users_from_users_json()
+    if not users:
+        users = _load_users_from_users_json()
+
+    with _lock:
+        _users_cache["sig"] = sig
+        _users_cache["users"] = users
+    return users
+
+
+# -----------------------------
+# Sessão assinada (HMAC)
+# -----------------------------
+def _session_key() -> bytes:
+    """
+    Chave HMAC: `auth_secret` nos secrets (tokens valem entre reinícios e
+    réplicas) ou uma chave aleatória do processo.
+    """
+    try:
+        k = st.secrets.get("auth_secret", None)
+        if k:
+            return str(k).encode("utf-8")
+    except Exception:
+        pass
+    return _chave_processo
+
+
+def _b64(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).rstrip(b"=").decode("ascii")
+
+
+def _unb64(s: str) -> bytes:
+    return base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+
+
+def _token_mac(payload: str, hashed: str) -> bytes:
+    # inclui o hash da senha: trocar a senha invalida os tokens antigos
+    msg = f"{payload}|{hashed}".encode("utf-8")
+    return hmac.new(_session_key(), msg, hashlib.sha256).digest()
+
+
+def make_session_token(username: str, users: dict, ttl_s: int = SESSION_TTL_S) -> str:
+    hashed = (users.get(username) or {}).get("hash", "")
+    payload = f"{username}|{int(time.time()) + ttl_s}"
+    return f"{_b64(payload.encode('utf-8'))}.{_b64(_token_mac(payload, hashed))}"
+
+
+def verify_session_token(token: str, users: dict) -> Optional[str]:
+    """Devolve o usuário se o token for válido e não expirado (só HMAC, sem PBKDF2)."""
+    try:
+        p64, mac64 = token.split(".", 1)
+        payload = _unb64(p64).decode("utf-8")
+        username, exp = payload.rsplit("|", 1)
+        mac = _unb64(mac64)
+    except Exception:
+        return None
+
+    hashed = (users.get(username) or {}).get("hash")
+    if not hashed:
+        return None
+    if not hmac.compare_digest(mac, _token_mac(payload, hashed)):
+        return None
+    if int(exp) < time.time():
+        return None
+    return username
+
+
+# -----------------------------
+# Limite de tentativas
+# -----------------------------
+def _cliente_id() -> str:
+    """
+    IP da conexão (WebSocket) desta sessão; "" se indisponível (ex.: AppTest).
+    Atrás de um proxy todas as sessões têm o mesmo IP e o limite volta a ser
+    só por usuário.
+    """
+    try:
+        from streamlit.runtime import get_instance
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        client = get_instance().get_client(get_script_run_ctx().session_id)
+        return str(client.request.remote_ip or "")
+    except Exception:
+        return ""
+
+
+def _segundos_bloqueado(chave: tuple) -> float:
+    now = time.monotonic()
+    with _lock:
+        entry = _falhas.get(chave)
+        if entry and entry[1] > now:
+            return entry[1] - now
+    return 0.0
+
+
+def _reservar_verificacao() -> float:
+    """
+    Limite global de verificações PBKDF2: reserva uma vaga ou devolve a espera.
+    Só é chamada para usuários que existem (os outros nem rodam o PBKDF2).
+    """
+    now = time.monotonic()
+    with _lock:
+        while _verificacoes and now - _verificacoes[0] > 60:
+            _verificacoes.popleft()
+        if len(_verificacoes) >= MAX_VERIFICACOES_MIN:
+            return 60 - (now - _verificacoes[0])
+        _verificacoes.append(now)
+    return 0.0
+
+
+def _registrar_falha(chave: tuple) -> None:
+    now = time.monotonic()
+    with _lock:
+        # descarta entradas vencidas (nomes aleatórios não acumulam)
+        if len(_falhas) > 10_000:
+            for k in [k for k, (_, ate) in _falhas.items() if ate <= now]:
+                del _falhas[k]
+        entry = _falhas.setdefault(chave, [0, 0.0])
+        entry[0] += 1
+        if entry[0] >= MAX_TENTATIVAS:
+            extra = min(entry[0] - MAX_TENTATIVAS, 30)
+            entry[1] = now + min(BLOQUEIO_BASE_S * 2 ** extra, BLOQUEIO_MAX_S)
+
+
+def _limpar_falhas(chave: tuple) -> None:
+    with _lock:
+        _falhas.pop(chave, None)
 
 
 def verify_password(username: str, password: str, users: dict) -> bool:
@@ -95,6 +264,15 @@ def require_login():
 
     users = load_users()
 
+    # recarregou a página: retoma a sessão pelo token (HMAC, sem PBKDF2)
+    token = st.query_params.get(SESSION_PARAM)
+    if token:
+        user = verify_session_token(token, users)
+        if user:
+            st.session_state.auth = {"logged_in": True, "user": user}
+            return
+        del st.query_params[SESSION_PARAM]
+
     # Logo no login
     if LOGO_PATH.exists():
         st.image(str(LOGO_PATH), width=180)
@@ -115,11 +293,21 @@ def require_login():
         submitted = st.form_submit_button("Entrar")
 
     if submitted:
-        if verify_password(username, password, users):
+        # por (cliente, usuário): outro visitante não bloqueia uma conta conhecida
+        chave = (_cliente_id(), username)
+        espera = _segundos_bloqueado(chave)
+        if espera == 0 and username in users:
+            espera = _reservar_verificacao()
+        if espera > 0:
+            st.error(f"Muitas tentativas. Tente novamente em {int(espera) + 1}s.")
+        elif verify_password(username, password, users):
+            _limpar_falhas(chave)
             st.session_state.auth = {"logged_in": True, "user": username}
+            st.query_params[SESSION_PARAM] = make_session_token(username, users)
             st.success("Login ok.")
             st.rerun()
         else:
+            _registrar_falha(chave)
             st.error("Usuário ou senha inválidos.")
     st.stop()
 
@@ -128,4 +316,6 @@ def logout_button():
     if st.session_state.get("auth", {}).get("logged_in"):
         if st.sidebar.button("Sair"):
             st.session_state.auth = {"logged_in": False, "user": None}
+            if SESSION_PARAM in st.query_params:
+                del st.query_params[SESSION_PARAM]
             st.rerun()
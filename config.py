@@ -1,3 +1,5 @@
+import os
+
 # ===============================
 # CONFIGURAÇÕES DO SISTEMA
 # ===============================
@@ -25,8 +27,6 @@ DEFAULT_SPREADSHEET_PATH = "planilha.xlsx"
 # ===============================
 # COORDENADAS# Ajuste aqui se sua planilha tiver nomes de colunas diferentes.
 # Se uma coluna não existir, o app simplesmente ignora filtros dela.
-import pandas as pd
-from pathlib import Path
 # ===============================# ===============================
 # CONFIGURAÇÕES DO SISTEMA
 # ===============================
@@ -94,19 +94,8 @@ CIDADES_CSV = "cidades.csv"
 # Cache automático de geocoding
 CIDADES_CACHE_CSV = "cidades_cache.csv"
 
-def read_spreadsheet(path: str) -> pd.DataFrame:
-    p = Path(path)
-    if not p.exists():
-        raise FileNotFoundError(f"Arquivo não encontrado: {path}")
-
-    suf = p.suffix.lower()
-
-    if suf == ".xls":
-        return pd.read_excel(p, engine="xlrd")
-    elif suf in [".xlsx", ".xlsm"]:
-        return pd.read_excel(p, engine="openpyxl")
-    else:
-        raise ValueError(f"Formato não suportado: {suf}")
+# Leitura da planilha: ver data_loader.read_spreadsheet
+# (Excel, CSV, Parquet e Feather, escolhido pela extensão/conteúdo)
 
 COL_VENDEDOR = "VENDEDOR"
 COL_UF_CLIENTE = "UF"
@@ -130,3 +119,47 @@ CIDADES_CSV = "cidades.csv"
 
 # Cache automático de geocoding
 CIDADES_CACHE_CSV = "cidades_cache.csv"
+
+
+# ===============================
+# UPLOAD
+# ===============================
+
+# A partir deste tamanho (MB) o app mede e mostra o pico de memória da leitura
+UPLOAD_GRANDE_MB = 50
+
+
+# ===============================
+# MAPA COROPLÉTICO (malhas IBGE)
+# ===============================
+
+# Gerados por: python tools/baixar_malhas.py e versionados em malhas/
+# (o build do Docker tenta atualizar). MALHAS_DIR troca a pasta.
+MALHAS_DIR = os.environ.get("MALHAS_DIR", "malhas")
+GEOJSON_UF = f"{MALHAS_DIR}/uf.geojson"
+GEOJSON_MUNICIPIOS = f"{MALHAS_DIR}/municipios.geojson"
+
+# Propriedades do GeoJSON usadas para juntar com a planilha
+GEOJSON_UF_PROP = "sigla"
+GEOJSON_MUN_NOME_PROP = "nome"
+GEOJSON_MUN_UF_PROP = "uf"
+
+# Zoom da simplificação gravada nos arquivos (o app simplifica de novo por zoom)
+GEOJSON_ZOOM_BASE = 10
+
+
+# ===============================
+# SNAPSHOT COMPARTILHADO (Arrow)
+# ===============================
+
+# Planilha padrão já processada (Feather, memory-mapped) - compartilhada entre sessões
+SNAPSHOT_DIR = ".snapshot"
+
+
+# ===============================
+# MAPA (PONTOS)
+# ===============================
+
+# Acima deste número de pontos as bolinhas são desenhadas em canvas
+# (camada única com arrays compactos, HTML bem menor)
+LIMITE_CANVAS = 1000
@@ -1,25 +1,571 @@
+import io
+import os
+import hashlib
+import tempfile
+import threading
+import multiprocessing
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import Union, IO
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Union, IO, List, Optional, Sequence, Tuple
 
-def read_spreadsheet(source: Union[str, Path, IO[bytes]]) -> pd.DataFrame:
+# Fonte nomeada de bytes (ex.: arquivo do Streamlit uploader)
+NamedBytes = Tuple[str, Union[bytes, memoryview]]
+
+# Encoding quando o CSV não é UTF-8 (export do Excel pt-BR no Windows).
+# cp1252 e não latin-1: latin-1 vira – e “ em caracteres de controle.
+CSV_ENCODING_FALLBACK = "cp1252"
+
+# Coluna adicionada na ingestão múltipla com a origem de cada linha
+COL_ORIGEM = "ORIGEM"
+
+# Amostragem do RSS durante leituras grandes (measure_peak_memory)
+RSS_AMOSTRA_S = 0.01
+RSS_PAGE_BYTES = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# DataFrame.attrs: maior pico de RSS dos workers (lido por measure_peak_memory)
+ATTR_PICO_WORKERS = "pico_rss_workers"
+
+def _norm_col(c: str) -> str:
+    c = str(c).replace("\n", " ").replace("\r", " ")
+    c = " ".join(c.split())
+    return c.strip()
+
+
+# -----------------------------
+# Uploads em memória (sem cópia)
+# -----------------------------
+class MemoryViewIO(io.RawIOBase):
+    """
+    Arquivo somente-leitura sobre um memoryview, sem copiar os bytes.
+
+    BytesIO(memoryview) duplica o conteúdo; aqui cada read() copia só o
+    trecho pedido pelo parser e getbuffer() devolve o próprio memoryview
+    (Parquet/Feather leem direto dele).
+    """
+
+    def __init__(self, data: Union[bytes, memoryview]):
+        super().__init__()
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError(f"whence inválido: {whence}")
+        if pos < 0:
+            raise ValueError(f"posição negativa: {pos}")
+        self._pos = pos
+        return pos
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        chunk = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return chunk
+
+    def readinto(self, b) -> int:
+        chunk = self._view[self._pos:self._pos + len(b)]
+        n = len(chunk)
+        b[:n] = chunk
+        self._pos += n
+        return n
+
+    def getbuffer(self) -> memoryview:
+        return self._view
+
+
+def fingerprint(*buffers: Union[bytes, memoryview]) -> str:
+    """Hash (blake2b) do conteúdo, para reconhecer o mesmo upload entre reruns."""
+    h = hashlib.blake2b(digest_size=16)
+    for buf in buffers:
+        h.update(len(buf).to_bytes(8, "little"))
+        h.update(buf)
+    return h.hexdigest()
+
+
+def current_rss_bytes() -> Optional[int]:
+    """RSS atual do processo (Linux, /proc/self/statm); None se indisponível."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * RSS_PAGE_BYTES
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def measure_peak_memory(fn: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, Optional[int]]]:
+    """
+    Executa fn e devolve (resultado, medidas em bytes):
+      - rss:     maior RSS do processo durante a chamada menos o RSS do início,
+                 amostrado numa thread a cada RSS_AMOSTRA_S (inclui outras
+                 sessões; None fora do Linux)
+      - arrow:   memória a mais no alocador do Arrow ao final (Parquet/Feather)
+      - workers: maior pico de RSS entre os workers do pool (leitura múltipla)
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        pa = None
+
+    inicio = current_rss_bytes()
+    pico = {"rss": inicio}
+    parar = threading.Event()
+
+    def amostrar():
+        while not parar.wait(RSS_AMOSTRA_S):
+            atual = current_rss_bytes()
+            if atual is not None and atual > pico["rss"]:
+                pico["rss"] = atual
+
+    amostrador = None
+    if inicio is not None:
+        amostrador = threading.Thread(target=amostrar, daemon=True)
+        amostrador.start()
+
+    arrow_antes = pa.total_allocated_bytes() if pa is not None else 0
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        parar.set()
+        if amostrador is not None:
+            amostrador.join()
+
+    medidas = {
+        "rss": None,
+        "arrow": max(0, pa.total_allocated_bytes() - arrow_antes) if pa is not None else 0,
+        "workers": 0,
+    }
+    if inicio is not None:
+        fim = current_rss_bytes() or 0
+        medidas["rss"] = max(pico["rss"], fim) - inicio
+    if isinstance(result, pd.DataFrame):
+        medidas["workers"] = int(result.attrs.pop(ATTR_PICO_WORKERS, 0) or 0)
+    return result, medidas
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """Pico de RSS do processo (Linux/macOS); None se indisponível."""
+    try:
+        import resource
+        import sys
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KiB, macOS em bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+# -----------------------------
+# Backends de leitura
+# -----------------------------
+# nome -> {"reader", "extensions", "magic", "sheet_names"}
+_BACKENDS: Dict[str, dict] = {}
+
+
+def register_backend(
+    name: str,
+    reader: Callable,
+    extensions: Sequence[str] = (),
+    magic: Sequence[bytes] = (),
+    sheet_names: Optional[Callable] = None,
+) -> None:
+    """
+    Registra um leitor de planilha.
+
+    reader(src, sheet) recebe caminho ou arquivo-like e devolve DataFrame.
+    sheet_names(src) é opcional e só existe para formatos com abas (Excel).
+    """
+    _BACKENDS[name] = {
+        "reader": reader,
+        "extensions": tuple(e.lower() for e in extensions),
+        "magic": tuple(magic),
+        "sheet_names": sheet_names,
+    }
+
+
+def _peek(src, n: int = 8) -> bytes:
+    """Lê os primeiros bytes sem consumir o arquivo."""
+    if isinstance(src, (str, Path)):
+        with open(src, "rb") as f:
+            return f.read(n)
+    pos = src.tell()
+    try:
+        return src.read(n)
+    finally:
+        src.seek(pos)
+
+
+def detect_backend(src, name: Optional[str] = None) -> str:
+    """
+    Escolhe o backend pela extensão (do caminho ou do nome enviado) e,
+    se não houver extensão conhecida, pelo conteúdo (magic bytes).
+    CSV é o padrão quando nada bate.
+    """
+    if name is None and isinstance(src, (str, Path)):
+        name = str(src)
+    suf = Path(name).suffix.lower() if name else ""
+
+    if suf:
+        for backend, spec in _BACKENDS.items():
+            if suf in spec["extensions"]:
+                return backend
+
+    head = _peek(src)
+    for backend, spec in _BACKENDS.items():
+        if any(head.startswith(m) for m in spec["magic"]):
+            return backend
+    return "csv"
+
+
+# Excel: calamine (Rust, bem mais rápido) se instalado; senão openpyxl/xlrd
+try:
+    import python_calamine  # noqa: F401
+    _HAS_CALAMINE = True
+except ImportError:
+    _HAS_CALAMINE = False
+
+
+def _excel_engine(fallback: str) -> str:
+    return "calamine" if _HAS_CALAMINE else fallback
+
+
+def _read_xlsx(src, sheet=None) -> pd.DataFrame:
+    return pd.read_excel(src, sheet_name=sheet or 0, engine=_excel_engine("openpyxl"))
+
+
+def _read_xls(src, sheet=None) -> pd.DataFrame:
+    return pd.read_excel(src, sheet_name=sheet or 0, engine=_excel_engine("xlrd"))
+
+
+def _sheets_xlsx(src) -> List[str]:
+    with pd.ExcelFile(src, engine=_excel_engine("openpyxl")) as xls:
+        return [str(s) for s in xls.sheet_names]
+
+
+def _sheets_xls(src) -> List[str]:
+    with pd.ExcelFile(src, engine=_excel_engine("xlrd")) as xls:
+        return [str(s) for s in xls.sheet_names]
+
+
+def _sniff_csv(src) -> Tuple[str, str]:
+    """Descobre separador e encoding a partir do início do arquivo."""
+    head = _peek(src, 64 * 1024)
+    try:
+        text = head.decode("utf-8-sig")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # multibyte cortado no fim do bloco ainda é utf-8
+        if e.start >= len(head) - 3:
+            text = head[:e.start].decode("utf-8-sig")
+            encoding = "utf-8-sig"
+        else:
+            text = head.decode(CSV_ENCODING_FALLBACK, errors="replace")
+            encoding = CSV_ENCODING_FALLBACK
+
+    first = text.splitlines()[0] if text else ""
+    sep = max([";", ",", "\t", "|"], key=first.count)
+    return sep, encoding
+
+
+def _read_csv(src, sheet=None) -> pd.DataFrame:
+    sep, encoding = _sniff_csv(src)
+    # ";" é o separador do Excel pt-BR, que grava números como 3.500,00
+    numeros = {"decimal": ",", "thousands": "."} if sep == ";" else {}
+    # low_memory=False: tipo de cada coluna inferido no arquivo todo (sem object misturado)
+    try:
+        return pd.read_csv(src, sep=sep, encoding=encoding, low_memory=False, **numeros)
+    except UnicodeDecodeError:
+        # o início era ASCII/UTF-8 mas um acento mais adiante não é
+        if encoding == CSV_ENCODING_FALLBACK:
+            raise
+        if not isinstance(src, (str, Path)):
+            src.seek(0)
+        return pd.read_csv(
+            src, sep=sep, encoding=CSV_ENCODING_FALLBACK, encoding_errors="replace",
+            low_memory=False, **numeros,
+        )
+
+
+def _arrow_buffer(src):
+    """Buffer Arrow sem cópia a partir de BytesIO/bytes/memoryview."""
+    import pyarrow as pa
+
+    if hasattr(src, "getbuffer"):
+        return pa.BufferReader(pa.py_buffer(src.getbuffer()))
+    return pa.BufferReader(pa.py_buffer(src.read()))
+
+
+def _arrow_to_pandas(table) -> pd.DataFrame:
+    # split_blocks evita consolidar colunas numéricas (reaproveita os buffers Arrow)
+    return table.to_pandas(split_blocks=True)
+
+
+def _read_parquet(src, sheet=None) -> pd.DataFrame:
+    import pyarrow.parquet as pq
+
+    if isinstance(src, (str, Path)):
+        table = pq.read_table(str(src), memory_map=True)
+    else:
+        table = pq.read_table(_arrow_buffer(src))
+    return _arrow_to_pandas(table)
+
+
+def _read_feather(src, sheet=None) -> pd.DataFrame:
+    import pyarrow.feather as feather
+    import pyarrow.ipc as ipc
+
+    if isinstance(src, (str, Path)):
+        table = feather.read_table(str(src), memory_map=True)
+    else:
+        table = ipc.open_file(_arrow_buffer(src)).read_all()
+    return _arrow_to_pandas(table)
+
+
+register_backend("xlsx", _read_xlsx, [".xlsx", ".xlsm"], [b"PK\x03\x04"], _sheets_xlsx)
+register_backend("xls", _read_xls, [".xls"], [b"\xd0\xcf\x11\xe0"], _sheets_xls)
+register_backend("parquet", _read_parquet, [".parquet", ".pq"], [b"PAR1"])
+register_backend("feather", _read_feather, [".feather", ".arrow", ".ipc"], [b"ARROW1"])
+register_backend("csv", _read_csv, [".csv", ".txt", ".tsv"])
+
+# Extensões aceitas (ex.: file_uploader do app)
+SUPPORTED_EXTENSIONS = [e.lstrip(".") for spec in _BACKENDS.values() for e in spec["extensions"]]
+
+
+def read_spreadsheet(source: Union[str, Path, IO[bytes]], name: Optional[str] = None) -> pd.DataFrame:
     """
     Lê planilha a partir de:
       - caminho (str/Path)
       - arquivo-like (ex.: BytesIO do Streamlit uploader)
+
+    O formato (Excel, CSV, Parquet, Feather) vem da extensão do caminho ou
+    de `name` (nome do arquivo enviado); sem extensão, o conteúdo é inspecionado.
+    As colunas saem normalizadas com `_norm_col`.
     """
     # Caso seja caminho
     if isinstance(source, (str, Path)):
         p = Path(source)
         if not p.exists():
             raise FileNotFoundError(f"Arquivo não encontrado: {source}")
-        return pd.read_excel(p, engine="openpyxl")
+        source = p
+    else:
+        # Caso seja arquivo em memória / file-like
+        # (Streamlit uploader -> BytesIO)
+        try:
+            source.seek(0)
+        except Exception:
+            pass
 
-    # Caso seja arquivo em memória / file-like
-    # (Streamlit uploader -> BytesIO)
-    try:
-        source.seek(0)
-    except Exception:
-        pass
+    backend = detect_backend(source, name)
+    df = _BACKENDS[backend]["reader"](source, None)
+    df.columns = [_norm_col(c) for c in df.columns]
+    return df
+
+
+# Faixas de tempo de contrato (dias) usadas em filtros e rankings
+FAIXAS_TEMPO = [
+    (180, "até 6m"),
+    (365, "6m a 1a"),
+    (730, "1a a 2a"),
+    (1825, "2a a 5a"),
+    (np.inf, "mais de 5a"),
+]
+
+
+def format_date_col(dt: pd.Series) -> pd.Series:
+    """Coluna datetime -> "dd/mm/aaaa" (vazio quando NaT)."""
+    return dt.dt.strftime("%d/%m/%Y").fillna("")
+
+
+def tempo_contrato_dias(dt: pd.Series, hoje: Optional[pd.Timestamp] = None) -> pd.Series:
+    """Dias desde a assinatura (datas futuras = 0; NaN quando NaT)."""
+    hoje = np.datetime64((hoje or pd.Timestamp.today()).normalize(), "D")
+    dias = (hoje - dt.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")).astype("timedelta64[D]")
+    out = dias.astype(float)
+    out[np.isnat(dias)] = np.nan
+    return pd.Series(np.clip(out, 0, None), index=dt.index)
+
+
+def format_tempo_contrato_col(dias: pd.Series) -> pd.Series:
+    """Dias -> "1a 3m" / "2m" / "12d" (mesma regra: ano=365d, mês=30d)."""
+    valido = dias.notna()
+    d = dias.fillna(0).astype(np.int64)
+    anos, resto = d // 365, d % 365
+    meses, dd = resto // 30, resto % 30
+
+    parte_a = (anos.astype(str) + "a").where(anos > 0, "")
+    parte_m = (meses.astype(str) + "m").where(meses > 0, "")
+    out = (parte_a + " " + parte_m).str.strip()
+    out = out.where(out != "", dd.astype(str) + "d")
+    return out.where(valido, "")
+
+
+def add_tenure_columns(df: pd.DataFrame, hoje: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+    """
+    A partir de ASSINATURA_DT (já convertida) cria, de uma vez só:
+      ASSINATURA_FMT, TEMPO_DIAS, TEMPO_CONTRATO e FAIXA_TEMPO.
+    """
+    dias = tempo_contrato_dias(df["ASSINATURA_DT"], hoje)
+    df["ASSINATURA_FMT"] = format_date_col(df["ASSINATURA_DT"])
+    df["TEMPO_DIAS"] = dias
+    df["TEMPO_CONTRATO"] = format_tempo_contrato_col(dias)
+    df["FAIXA_TEMPO"] = pd.cut(
+        dias,
+        bins=[0] + [lim for lim, _ in FAIXAS_TEMPO],
+        labels=[rot for _, rot in FAIXAS_TEMPO],
+        right=False,
+    )
+    return df
+
+
+def prepare_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normaliza colunas (resolve VALOR\nMENSAL etc.), cria ASSINATURA_DT
+    a partir de ASSINATURA CONTRATO e as colunas de tempo de contrato.
+    Altera e devolve o próprio DataFrame.
+    """
+    df.columns = [_norm_col(c) for c in df.columns]
+
+    # Coluna datetime para filtro (ASSINATURA CONTRATO)
+    if "ASSINATURA CONTRATO" in df.columns:
+        df["ASSINATURA_DT"] = pd.to_datetime(df["ASSINATURA CONTRATO"], errors="coerce", dayfirst=True)
+    else:
+        df["ASSINATURA_DT"] = pd.NaT
+    return add_tenure_columns(df)
+
+
+def _source_name(source: Union[str, Path, NamedBytes]) -> str:
+    if isinstance(source, tuple):
+        return str(source[0])
+    return Path(source).name
+
+
+def _open_source(source: Union[str, Path, NamedBytes]):
+    if isinstance(source, tuple):
+        return MemoryViewIO(source[1])
+    p = Path(source)
+    if not p.exists():
+        raise FileNotFoundError(f"Arquivo não encontrado: {source}")
+    return p
+
+
+def _sheet_names(source: Union[str, Path, NamedBytes]) -> List[Optional[str]]:
+    src = _open_source(source)
+    lister = _BACKENDS[detect_backend(src, _source_name(source))]["sheet_names"]
+    if lister is None:
+        # formatos sem abas (CSV, Parquet, Feather)
+        return [None]
+    return lister(src)
+
+
+def _read_sheet(task: Tuple[Union[str, Path, NamedBytes], Optional[str], str]) -> pd.DataFrame:
+    """Worker do pool: lê uma aba, normaliza colunas e marca a origem."""
+    source, sheet, origem = task
+    src = _open_source(source)
+    backend = detect_backend(src, _source_name(source))
+    df = _BACKENDS[backend]["reader"](src, sheet)
+    df.columns = [_norm_col(c) for c in df.columns]
+    df[COL_ORIGEM] = origem
+    df.attrs[ATTR_PICO_WORKERS] = peak_rss_bytes() or 0
+    return df
+
+
+# Pool único do processo, reaproveitado entre chamadas (e sessões)
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_WORKERS: Optional[int] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _get_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Devolve o pool de leitura, criando na primeira vez. Usa "spawn": fork de
+    um processo com threads (servidor do Streamlit) pode herdar locks presos.
+    """
+    global _POOL, _POOL_WORKERS
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != max_workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False)
+            _POOL = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+            _POOL_WORKERS = max_workers
+        return _POOL
+
+
+def _reset_pool(pool: ProcessPoolExecutor) -> None:
+    """Descarta o pool quebrado (worker morreu) para a próxima chamada criar outro."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False)
+
+
+def read_spreadsheets(
+    sources: Sequence[Union[str, Path, NamedBytes]],
+    all_sheets: bool = False,
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Lê vários arquivos (e, opcionalmente, todas as abas de cada um) em paralelo
+    e concatena tudo num único DataFrame.
+
+    Cada fonte pode ser um caminho ou uma tupla (nome, bytes) vinda do uploader.
+    As colunas são normalizadas com `_norm_col` e a coluna ORIGEM indica de qual
+    arquivo/aba veio cada linha ("arquivo.xlsx" ou "arquivo.xlsx:ABA").
+    """
+    tasks = []
+    for source in sources:
+        nome = _source_name(source)
+        if all_sheets:
+            for sheet in _sheet_names(source):
+                tasks.append((source, sheet, f"{nome}:{sheet}" if sheet else nome))
+        else:
+            tasks.append((source, None, nome))
+
+    if not tasks:
+        return pd.DataFrame(columns=[COL_ORIGEM])
+
+    # uma tarefa só não compensa subir processos
+    if len(tasks) == 1 or max_workers == 1:
+        frames = [_read_sheet(t) for t in tasks]
+    else:
+        # bytes nas tarefas seriam copiados e serializados uma vez por aba:
+        # cada upload vai uma única vez para um arquivo temporário e as
+        # tarefas levam só o caminho (com a extensão original)
+        with tempfile.TemporaryDirectory(prefix="planilhas_") as tmp:
+            caminhos: Dict[int, Path] = {}
+            for i, (src, sheet, origem) in enumerate(tasks):
+                if isinstance(src, tuple):
+                    if id(src) not in caminhos:
+                        p = Path(tmp) / f"{len(caminhos)}{Path(src[0]).suffix}"
+                        p.write_bytes(src[1])
+                        caminhos[id(src)] = p
+                    tasks[i] = (caminhos[id(src)], sheet, origem)
+
+            pool = _get_pool(max_workers)
+            try:
+                frames = list(pool.map(_read_sheet, tasks))
+            except BrokenProcessPool:
+                _reset_pool(pool)
+                raise
 
-    return pd.read_excel(source, engine="openpyxl")
\ No newline at end of file
+    pico = max(f.attrs.pop(ATTR_PICO_WORKERS, 0) for f in frames)
+    df = pd.concat(frames, ignore_index=True, sort=False)
+    if len(tasks) > 1 and max_workers != 1:
+        df.attrs[ATTR_PICO_WORKERS] = pico
+    return df
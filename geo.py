@@ -1,11 +1,35 @@
+import unicodedata
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from typing import Tuple
 from geopy.geocoders import Nominatim
 
+# Raio médio da Terra (km)
+EARTH_RADIUS_KM = 6371.0088
+
+def norm_text_basic(s: str) -> str:
+    """Normaliza texto (remove acentos, lowercase, trim, espaços)."""
+    if s is None:
+        return ""
+    s = str(s)
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = s.lower().strip()
+    s = " ".join(s.split())
+    return s
+
+def norm_uf(uf: str) -> str:
+    uf = norm_text_basic(uf).upper()
+    return uf[:2] if uf else ""
+
 def explode_cidades(df: pd.DataFrame, col="CIDADES_ATENDIDAS") -> pd.DataFrame:
     df = df.copy()
     df[col] = df[col].fillna("").astype(str)
 
+    # identifica o cliente (linha original) em cada cidade explodida
+    df["ID_CLIENTE"] = df.index
+
     # separa por ';' e explode em várias linhas
     df[col] = df[col].apply(lambda s: [x.strip() for x in s.split(";") if x.strip()])
     df = df.explode(col, ignore_index=True)
@@ -34,22 +58,26 @@ def explode_cidades(df: pd.DataFrame, col="CIDADES_ATENDIDAS") -> pd.DataFrame:
     df = df[(df["CIDADE_ATENDIDA"] != "") & (df["UF_ATENDIDA"] != "")]
     return df
 
+def with_coord_id(coords: pd.DataFrame) -> pd.DataFrame:
+    """COORD_ID = posição da linha na tabela de coordenadas (vai junto nos merges)."""
+    return coords.assign(COORD_ID=np.arange(len(coords), dtype=np.int64))
+
 def load_city_coords_csv(path: str) -> pd.DataFrame:
     df = pd.read_csv(path)
     df["cidade_norm"] = df["cidade"].astype(str).str.strip().str.lower()
     df["uf_norm"] = df["uf"].astype(str).str.strip().str.upper()
-    return df[["cidade_norm","uf_norm","lat","lon"]]
+    return with_coord_id(df[["cidade_norm","uf_norm","lat","lon"]])
 
 def load_cache(path: str) -> pd.DataFrame:
     p = Path(path)
     if not p.exists():
-        return pd.DataFrame(columns=["cidade_norm","uf_norm","lat","lon"])
+        return with_coord_id(pd.DataFrame(columns=["cidade_norm","uf_norm","lat","lon"]))
     df = pd.read_csv(p)
-    return df[["cidade_norm","uf_norm","lat","lon"]]
+    return with_coord_id(df[["cidade_norm","uf_norm","lat","lon"]])
 
 def save_cache(path: str, df_cache: pd.DataFrame) -> None:
     df_cache = df_cache.drop_duplicates(subset=["cidade_norm","uf_norm"]).copy()
-    df_cache.to_csv(path, index=False)
+    df_cache[["cidade_norm","uf_norm","lat","lon"]].to_csv(path, index=False)
 
 def geocode_missing(unique_cities: pd.DataFrame, cache_df: pd.DataFrame, user_agent="heatmap_provedores_app"):
     # unique_cities: cidade_norm, uf_norm, CIDADE_ATENDIDA, UF_ATENDIDA
@@ -78,4 +106,85 @@ def geocode_missing(unique_cities: pd.DataFrame, cache_df: pd.DataFrame, user_ag
             })
     if new_rows:
         cache_df = pd.concat([cache_df, pd.DataFrame(new_rows)], ignore_index=True)
-    return cache_df
+    return with_coord_id(cache_df)
+
+
+# -----------------------------
+# Índice espacial (raio / mais próximos)
+# -----------------------------
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Distância em km (vetorizada) entre pontos em graus."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GridIndex:
+    """
+    Índice em grade (células de `cell_deg` graus) sobre pontos lat/lon.
+
+    A consulta por raio só calcula haversine para os pontos das células que
+    cobrem o retângulo do raio, em vez de percorrer o dataset inteiro.
+    """
+
+    def __init__(self, lat, lon, cell_deg: float = 0.5):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.cell_deg = float(cell_deg)
+
+        ci = np.floor(self.lat / self.cell_deg).astype(np.int64)
+        cj = np.floor(self.lon / self.cell_deg).astype(np.int64)
+        keys = self._key(ci, cj)
+
+        # pontos ordenados por célula; cada célula vira uma fatia [ini, fim)
+        self.order = np.argsort(keys, kind="stable")
+        ukeys, starts, counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+        self.cells = {int(k): (int(s), int(s + c)) for k, s, c in zip(ukeys, starts, counts)}
+
+    @staticmethod
+    def _key(ci, cj):
+        # desloca para inteiros positivos (lat em [-90, 90], lon em [-180, 180])
+        return (ci + 1024) * 4096 + (cj + 2048)
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Posições (ordenadas pela distância) e distâncias dos pontos a até `radius_km`."""
+        if len(self) == 0 or radius_km <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=float)
+
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        coslat = max(np.cos(np.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        dlon = min(dlat / coslat, 180.0)
+
+        i0, i1 = int(np.floor((lat - dlat) / self.cell_deg)), int(np.floor((lat + dlat) / self.cell_deg))
+        j0, j1 = int(np.floor((lon - dlon) / self.cell_deg)), int(np.floor((lon + dlon) / self.cell_deg))
+
+        fatias = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                cell = self.cells.get(int(self._key(i, j)))
+                if cell is not None:
+                    fatias.append(self.order[cell[0]:cell[1]])
+        if not fatias:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=float)
+
+        cand = np.concatenate(fatias)
+        dist = haversine_km(lat, lon, self.lat[cand], self.lon[cand])
+        ok = dist <= radius_km
+        cand, dist = cand[ok], dist[ok]
+        ordem = np.argsort(dist, kind="stable")
+        return cand[ordem], dist[ordem]
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Os k pontos mais próximos (aumenta o raio até achar k pontos)."""
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=float)
+        raio = self.cell_deg * 111.0
+        while True:
+            idx, dist = self.query_radius(lat, lon, raio)
+            if len(idx) >= k or raio >= np.pi * EARTH_RADIUS_KM:
+                return idx[:k], dist[:k]
+            raio *= 2
@@ -0,0 +1,255 @@
+import json
+import math
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from branca.element import Template
+from folium.map import Layer
+
+# -----------------------------
+# Malhas (GeoJSON) para o modo coroplético
+# -----------------------------
+
+
+def load_geojson(path: str) -> dict:
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"Arquivo não encontrado: {path}")
+    return json.loads(p.read_text(encoding="utf-8"))
+
+
+def zoom_tolerance(zoom: int) -> float:
+    """Tolerância de simplificação (graus) ~ 1 pixel no zoom dado."""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def _douglas_peucker(pts: np.ndarray, tol: float) -> np.ndarray:
+    n = len(pts)
+    if n < 3:
+        return pts
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        seg = pts[i + 1:j]
+        a, d = pts[i], pts[j] - pts[i]
+        norm = math.hypot(d[0], d[1])
+        if norm == 0:
+            dist = np.hypot(seg[:, 0] - a[0], seg[:, 1] - a[1])
+        else:
+            dist = np.abs(d[0] * (seg[:, 1] - a[1]) - d[1] * (seg[:, 0] - a[0])) / norm
+        k = int(np.argmax(dist))
+        if dist[k] > tol:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return pts[keep]
+
+
+def _simplify_ring(ring: List, tol: float, decimals: int) -> List:
+    pts = np.asarray(ring, dtype=float)[:, :2]
+    out = _douglas_peucker(pts, tol)
+    # anel precisa de 4 pontos (fechado); áreas pequenas ficam como estão
+    if len(out) < 4:
+        out = pts
+    return np.round(out, decimals).tolist()
+
+
+def simplify_geojson(gj: dict, zoom: int) -> dict:
+    """
+    Simplifica (Douglas-Peucker) e arredonda as coordenadas de Polygon /
+    MultiPolygon para o nível de zoom, reduzindo o tamanho do GeoJSON
+    enviado ao navegador. Propriedades são mantidas.
+    """
+    tol = zoom_tolerance(zoom)
+    decimals = max(2, min(6, math.ceil(-math.log10(tol)) + 1))
+
+    features = []
+    for f in gj.get("features", []):
+        geom = f.get("geometry") or {}
+        gtype = geom.get("type")
+        if gtype == "Polygon":
+            coords = [_simplify_ring(r, tol, decimals) for r in geom["coordinates"]]
+        elif gtype == "MultiPolygon":
+            coords = [[_simplify_ring(r, tol, decimals) for r in poly] for poly in geom["coordinates"]]
+        else:
+            continue
+        features.append({
+            "type": "Feature",
+            "properties": dict(f.get("properties") or {}),
+            "geometry": {"type": gtype, "coordinates": coords},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def join_features(gj: dict, key_fn: Callable[[dict], str], valores: Dict[str, dict]) -> dict:
+    """
+    Junta agregados às áreas: key_fn(properties) gera a chave da área e
+    `valores[chave]` (ex.: {"QTDE": 12}) entra nas propriedades, junto de "_key".
+    Só áreas com valor são devolvidas; a geometria é reaproveitada (sem cópia).
+    """
+    features = []
+    for f in gj["features"]:
+        key = key_fn(f["properties"])
+        if key not in valores:
+            continue
+        props = dict(f["properties"])
+        props.update(valores[key])
+        props["_key"] = key
+        features.append({"type": "Feature", "properties": props, "geometry": f["geometry"]})
+    return {"type": "FeatureCollection", "features": features}
+
+
+# -----------------------------
+# Heatmap animado (linha do tempo)
+# -----------------------------
+def cumulative_frames(df: pd.DataFrame, date_col: str = "ASSINATURA_DT", weight_col: str = "PESO") -> Tuple[List, List[str]]:
+    """
+    Quadros mensais acumulados para HeatMapWithTime.
+
+    Soma o peso por (coordenada, mês) numa matriz, acumula ao longo dos meses
+    (cumsum) e normaliza pelo maior valor, para que o crescimento apareça na
+    animação. Devolve (quadros [[lat, lon, peso], ...], rótulos "mm/aaaa").
+    Meses sem assinatura repetem o quadro anterior.
+    """
+    d = df.dropna(subset=["lat", "lon", date_col])
+    if d.empty:
+        return [], []
+
+    # mês absoluto (ano * 12 + mês) -> coluna da matriz
+    meses = d[date_col].dt.year.to_numpy() * 12 + d[date_col].dt.month.to_numpy() - 1
+    mes_ini = int(meses.min())
+    n_meses = int(meses.max()) - mes_ini + 1
+    col = meses - mes_ini
+
+    coord_id, coords = pd.factorize(pd.MultiIndex.from_arrays([d["lat"], d["lon"]]))
+    coords = np.asarray(coords.tolist(), dtype=float)
+
+    pesos = d[weight_col].to_numpy(dtype=float) if weight_col in d.columns else np.ones(len(d))
+    matriz = np.zeros((len(coords), n_meses))
+    np.add.at(matriz, (coord_id, col), pesos)
+    matriz = np.cumsum(matriz, axis=1)
+    matriz /= matriz.max() or 1.0
+
+    frames = []
+    for j in range(n_meses):
+        ativos = matriz[:, j] > 0
+        frames.append(np.column_stack([coords[ativos], np.round(matriz[ativos, j], 4)]).tolist())
+
+    labels = [f"{(mes_ini + j) % 12 + 1:02d}/{(mes_ini + j) // 12}" for j in range(n_meses)]
+    return frames, labels
+
+
+# -----------------------------
+# Pontos em canvas (muitos pontos)
+# -----------------------------
+class CanvasPointLayer(Layer):
+    """
+    Camada de pontos desenhada no canvas do Leaflet (um único <canvas> em vez
+    de um elemento SVG por CircleMarker).
+
+    Os dados vão em arrays compactos:
+      points:  [[lat, lon, raio, [i_registro, ...]], ...]
+      records: [[campo1, campo2, ...], ...]  (cada registro aparece uma vez)
+    e o HTML do popup é montado no navegador só quando o ponto é clicado.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                var renderer = L.canvas({padding: 0.5{% if this.pane %}, pane: {{ this.pane|tojson }}{% endif %}});
+                var points = {{ this.points|tojson }};
+                var records = {{ this.records|tojson }};
+                var labels = {{ this.labels|tojson }};
+                var style = {{ this.style|tojson }};
+                var layer = L.featureGroup();
+
+                function esc(v) {
+                    return String(v).replace(/[&<>"']/g, function(c) {
+                        return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}[c];
+                    });
+                }
+
+                function popupHtml(p) {
+                    var html = '<div style="width:360px;max-height:260px;overflow:auto;font-size:13px;line-height:1.35;">'
+                        + '<div style="margin-bottom:8px;"><b>' + esc({{ this.title|tojson }}) + '</b> ' + p[3].length + '</div>';
+                    for (var k = 0; k < p[3].length; k++) {
+                        var r = records[p[3][k]];
+                        html += '<div style="padding:6px 0;border-bottom:1px solid #eee;"><b>' + esc(r[0]) + '</b>';
+                        for (var c = 1; c < r.length; c++) {
+                            html += '<br><span>' + esc(labels[c]) + ': ' + esc(r[c]) + '</span>';
+                        }
+                        html += '</div>';
+                    }
+                    return html + '</div>';
+                }
+
+                for (var i = 0; i < points.length; i++) {
+                    var p = points[i];
+                    var m = L.circleMarker([p[0], p[1]], Object.assign({}, style, {renderer: renderer, radius: p[2]}));
+                    m._pidx = i;
+                    layer.addLayer(m);
+                }
+
+                layer.on("click", function(e) {
+                    L.popup({maxWidth: 420})
+                        .setLatLng(e.layer.getLatLng())
+                        .setContent(popupHtml(points[e.layer._pidx]))
+                        .openOn({{ this._parent.get_name() }});
+                });
+                return layer;
+            })();
+        {% endmacro %}
+    """)
+
+    def __init__(
+        self,
+        points: List,
+        records: List,
+        labels: Sequence[str],
+        title: str = "Registros neste ponto:",
+        style: Optional[dict] = None,
+        pane: Optional[str] = None,
+        name: Optional[str] = None,
+        overlay: bool = True,
+        control: bool = True,
+        show: bool = True,
+    ):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "CanvasPointLayer"
+        self.points = points
+        self.records = records
+        self.labels = list(labels)
+        self.title = title
+        self.style = style or {"color": "#1f77b4", "fill": True, "fillOpacity": 0.85, "weight": 1}
+        self.pane = pane
+
+
+def canvas_payload(df: pd.DataFrame, id_col: str, fields: Sequence[str], radius_fn: Callable[[np.ndarray], np.ndarray]):
+    """
+    Monta (points, records) para CanvasPointLayer a partir das linhas do mapa.
+
+    Cada registro (id_col) entra uma vez em `records` (colunas `fields`, já
+    como texto); cada coordenada vira [lat, lon, raio, [índices]].
+    """
+    codes, uniques = pd.factorize(df[id_col])
+    primeira = pd.Series(np.arange(len(df))).groupby(codes).first().to_numpy()
+    records = df.iloc[primeira][list(fields)].astype(str).to_numpy().tolist()
+
+    grupos = pd.Series(codes, index=df.index).groupby([df["lat"], df["lon"]], sort=False).agg(lambda s: sorted(set(s)))
+    lat = grupos.index.get_level_values(0).to_numpy(dtype=float)
+    lon = grupos.index.get_level_values(1).to_numpy(dtype=float)
+    n = np.fromiter((len(v) for v in grupos.values), dtype=np.int64, count=len(grupos))
+    raios = radius_fn(n)
+
+    points = [
+        [round(float(a), 5), round(float(b), 5), int(r), [int(i) for i in ids]]
+        for a, b, r, ids in zip(lat, lon, raios, grupos.values)
+    ]
+    return points, records
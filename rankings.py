@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from typing import Optional, Sequence
+
+# rótulo da métrica (tela) -> coluna agregada
+METRICAS = {
+    "Quantidade": "QTDE",
+    "PESO": "PESO",
+    "Receita (VALOR MENSAL rateado)": "RECEITA",
+}
+
+UF_PARA_REGIAO = {
+    "AC": "Norte", "AP": "Norte", "AM": "Norte", "PA": "Norte",
+    "RO": "Norte", "RR": "Norte", "TO": "Norte",
+    "AL": "Nordeste", "BA": "Nordeste", "CE": "Nordeste", "MA": "Nordeste",
+    "PB": "Nordeste", "PE": "Nordeste", "PI": "Nordeste", "RN": "Nordeste", "SE": "Nordeste",
+    "DF": "Centro-Oeste", "GO": "Centro-Oeste", "MT": "Centro-Oeste", "MS": "Centro-Oeste",
+    "ES": "Sudeste", "MG": "Sudeste", "RJ": "Sudeste", "SP": "Sudeste",
+    "PR": "Sul", "RS": "Sul", "SC": "Sul",
+}
+
+
+def regiao(uf: pd.Series) -> pd.Series:
+    return uf.astype(str).str.upper().map(UF_PARA_REGIAO).fillna("Desconhecida")
+
+
+def rateio_receita(df: pd.DataFrame, valor_col: str = "VALOR MENSAL", id_col: str = "ID_CLIENTE", peso_col: str = "PESO") -> pd.Series:
+    """
+    Divide o VALOR MENSAL de cada cliente entre as cidades atendidas na
+    proporção do PESO: valor * peso / soma(peso do cliente). Somando as
+    cidades de um cliente volta-se ao valor original (sem contagem dupla).
+    Cliente com peso total 0 divide igualmente.
+    """
+    if valor_col not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    valor = pd.to_numeric(df[valor_col], errors="coerce").fillna(0.0)
+    if id_col not in df.columns or peso_col not in df.columns:
+        return valor
+
+    peso = df[peso_col].astype(float)
+    grupos = peso.groupby(df[id_col].to_numpy())
+    total = grupos.transform("sum").to_numpy()
+    n = grupos.transform("size").to_numpy()
+    fracao = np.where(total > 0, peso.to_numpy() / np.where(total > 0, total, 1.0), 1.0 / n)
+    return valor * fracao
+
+
+def agregar(df: pd.DataFrame, chaves: Sequence[str], observed: bool = True, clientes: bool = False) -> pd.DataFrame:
+    """
+    QTDE (linhas), PESO (soma) e RECEITA (soma) por grupo, numa única passada.
+    clientes=True inclui CLIENTES (ID_CLIENTE distintos): com cidades atendidas,
+    QTDE conta cidades e um cliente com 30 cidades valeria 30.
+    """
+    d = df
+    if "PESO" not in d.columns:
+        d = d.assign(PESO=1.0)
+    if "RECEITA" not in d.columns:
+        d = d.assign(RECEITA=0.0)
+    agg = {"QTDE": ("PESO", "size"), "PESO": ("PESO", "sum"), "RECEITA": ("RECEITA", "sum")}
+    if clientes:
+        agg["CLIENTES"] = ("ID_CLIENTE", "nunique") if "ID_CLIENTE" in d.columns else ("PESO", "size")
+    return d.groupby(list(chaves), sort=False, observed=observed).agg(**agg).reset_index()
+
+
+def top_k(agg: pd.DataFrame, coluna: str, k: Optional[int] = None) -> pd.DataFrame:
+    """
+    As k linhas com maior `coluna`, em ordem decrescente. Seleciona com
+    argpartition (O(n)) e ordena só as k escolhidas; k=None ordena tudo.
+    """
+    vals = agg[coluna].to_numpy(dtype=float)
+    if k is None or k >= len(vals):
+        idx = np.argsort(-vals, kind="stable")
+    elif k <= 0:
+        idx = np.array([], dtype=np.int64)
+    else:
+        idx = np.argpartition(-vals, k - 1)[:k]
+        idx = idx[np.argsort(-vals[idx], kind="stable")]
+    return agg.iloc[idx].reset_index(drop=True)
+
+
+def ranking(df: pd.DataFrame, chaves: Sequence[str], metrica: str = "QTDE", k: Optional[int] = None, clientes: bool = False) -> pd.DataFrame:
+    return top_k(agregar(df, chaves, clientes=clientes), metrica, k)
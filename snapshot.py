@@ -0,0 +1,167 @@
+import os
+import hashlib
+from datetime import date
+import pandas as pd
+from pathlib import Path
+from typing import Optional, Tuple
+
+import config
+from data_loader import read_spreadsheet, read_spreadsheets, prepare_dataset
+from geo import explode_cidades, load_city_coords_csv, load_cache, norm_text_basic, norm_uf
+from rankings import rateio_receita
+
+# Mude ao alterar o conteúdo do snapshot (força reconstrução)
+SNAPSHOT_VERSION = 4
+
+
+def _coords_path() -> str:
+    return config.CIDADES_CSV if Path(config.CIDADES_CSV).exists() else config.CIDADES_CACHE_CSV
+
+
+def _file_sig(path: str) -> str:
+    p = Path(path)
+    if not p.exists():
+        return f"{path}:-"
+    st = p.stat()
+    return f"{p.resolve()}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def _snapshot_prefix(spreadsheet_path: str, all_sheets: bool) -> str:
+    """Identifica a configuração (planilha + todas abas); a key completa leva também a versão."""
+    ident = f"{Path(spreadsheet_path).resolve()}|{all_sheets}"
+    return hashlib.blake2b(ident.encode("utf-8"), digest_size=6).hexdigest()
+
+
+def snapshot_key(spreadsheet_path: str, all_sheets: bool = False) -> str:
+    """
+    Versão do snapshot: muda quando a planilha ou o arquivo de coordenadas
+    muda, e a cada dia (tempo de contrato é calculado na construção).
+    Começa pelo prefixo da configuração, para a limpeza achar as versões antigas.
+    """
+    partes = [
+        str(SNAPSHOT_VERSION),
+        _file_sig(spreadsheet_path),
+        _file_sig(_coords_path()),
+        str(all_sheets),
+        date.today().isoformat(),
+    ]
+    versao = hashlib.blake2b("|".join(partes).encode("utf-8"), digest_size=12).hexdigest()
+    return f"{_snapshot_prefix(spreadsheet_path, all_sheets)}-{versao}"
+
+
+def _arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Colunas object com tipos misturados (comum no Excel) viram texto."""
+    import pyarrow as pa
+
+    df = df.reset_index(drop=True)
+    for c in df.columns:
+        if df[c].dtype != object:
+            continue
+        try:
+            pa.array(df[c], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[c] = df[c].where(df[c].isna(), df[c].astype(str))
+    return df
+
+
+def _write_feather(df: pd.DataFrame, path: Path) -> None:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    # sem compressão: o arquivo pode ser memory-mapped sem descompactar
+    table = pa.Table.from_pandas(_arrow_safe(df), preserve_index=False)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    feather.write_feather(table, str(tmp), compression="uncompressed")
+    os.replace(tmp, path)
+
+
+def _read_feather(path: Path) -> pd.DataFrame:
+    import pyarrow.feather as feather
+
+    table = feather.read_table(str(path), memory_map=True)
+    # split_blocks: colunas numéricas sem nulos continuam apontando para o mmap
+    return table.to_pandas(split_blocks=True)
+
+
+def _with_base_coords(df: pd.DataFrame, coords_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cidade base do cliente (CIDADE/UF do cadastro) já com cidade_norm, uf_norm,
+    lat, lon, COORD_ID, ID_CLIENTE, PESO e RECEITA, como o app monta no modo
+    "Cidade base do cliente". Uma linha por cliente: cidade repetida na
+    tabela de coordenadas fica com a primeira.
+    """
+    col_uf = config.COL_UF_CLIENTE if config.COL_UF_CLIENTE in df.columns else "UF"
+    if "CIDADE" not in df.columns or col_uf not in df.columns:
+        return df
+
+    df = df.assign(
+        cidade_norm=df["CIDADE"].apply(norm_text_basic),
+        uf_norm=df[col_uf].apply(norm_uf),
+        ID_CLIENTE=df.index,
+    )
+    coords = coords_df.drop_duplicates(subset=["cidade_norm", "uf_norm"])
+    df = df.merge(coords, on=["cidade_norm", "uf_norm"], how="left")
+    df["PESO"] = 1
+    df["RECEITA"] = rateio_receita(df)
+    return df
+
+
+def build_snapshot(spreadsheet_path: str, all_sheets: bool = False, out_dir: Optional[str] = None) -> str:
+    """
+    Processa a planilha uma vez e grava em Feather:
+      - <key>_raw.feather: planilha com colunas normalizadas, ASSINATURA_DT, tempo de
+        contrato e a cidade base com coordenadas (_with_base_coords)
+      - <key>_exp.feather: cidades atendidas explodidas (ID_CLIENTE, PESO, RECEITA, ...) + lat/lon/COORD_ID
+    Versões antigas da mesma configuração são removidas; snapshots de outra
+    configuração (ex.: a variante "todas as abas") ficam. Devolve a key.
+    """
+    out = Path(out_dir or config.SNAPSHOT_DIR)
+    out.mkdir(parents=True, exist_ok=True)
+    key = snapshot_key(spreadsheet_path, all_sheets)
+
+    if all_sheets:
+        df = read_spreadsheets([spreadsheet_path], all_sheets=True)
+    else:
+        df = read_spreadsheet(spreadsheet_path)
+    df = prepare_dataset(df)
+
+    coords_path = _coords_path()
+    if coords_path == config.CIDADES_CSV:
+        coords_df = load_city_coords_csv(coords_path)
+    else:
+        coords_df = load_cache(coords_path)
+
+    if config.COL_CIDADES_ATENDIDAS in df.columns:
+        df_exp = explode_cidades(df, col=config.COL_CIDADES_ATENDIDAS)
+        df_exp = df_exp.assign(RECEITA=rateio_receita(df_exp))
+        df_exp = df_exp.merge(coords_df, on=["cidade_norm", "uf_norm"], how="left")
+    else:
+        df_exp = pd.DataFrame()
+    df = _with_base_coords(df, coords_df)
+
+    _write_feather(df_exp, out / f"{key}_exp.feather")
+    _write_feather(df, out / f"{key}_raw.feather")
+
+    prefixo = _snapshot_prefix(spreadsheet_path, all_sheets)
+    for old in out.glob(f"{prefixo}-*.feather"):
+        if not old.name.startswith(key):
+            try:
+                old.unlink()
+            except OSError:
+                pass
+    return key
+
+
+def load_snapshot(spreadsheet_path: str, all_sheets: bool = False, out_dir: Optional[str] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Devolve (planilha, cidades explodidas) do snapshot, construindo se preciso.
+    Os DataFrames são compartilhados: trate-os como somente leitura.
+    """
+    out = Path(out_dir or config.SNAPSHOT_DIR)
+    key = snapshot_key(spreadsheet_path, all_sheets)
+    raw_path, exp_path = out / f"{key}_raw.feather", out / f"{key}_exp.feather"
+
+    if not (raw_path.exists() and exp_path.exists()):
+        build_snapshot(spreadsheet_path, all_sheets, out_dir)
+
+    return _read_feather(raw_path), _read_feather(exp_path)
@@ -0,0 +1,29 @@
+import io
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_loader import read_spreadsheet  # noqa: E402
+
+
+def _csv_cp1252_acento_tardio() -> bytes:
+    linhas = ["CIDADE;UF;VALOR"] + [f"Cidade {i};MT;1.000,00" for i in range(5000)]
+    linhas.append("São João – “Centro”;SP;10,00")
+    return ("\r\n".join(linhas) + "\r\n").encode("cp1252")
+
+
+def test_csv_cp1252_com_acento_depois_do_inicio():
+    dados = _csv_cp1252_acento_tardio()
+    df = read_spreadsheet(io.BytesIO(dados), name="export.csv")
+    assert len(df) == 5001
+    assert df["CIDADE"].iloc[-1] == "São João – “Centro”"
+    assert df["VALOR"].iloc[-1] == 10.0
+    assert df["VALOR"].iloc[0] == 1000.0
+
+
+def test_csv_cp1252_por_caminho(tmp_path):
+    p = tmp_path / "export.csv"
+    p.write_bytes(_csv_cp1252_acento_tardio())
+    df = read_spreadsheet(p)
+    assert df["CIDADE"].iloc[-1] == "São João – “Centro”"
@@ -0,0 +1,78 @@
+"""
+Baixa as malhas do IBGE (UF e municípios) para o modo coroplético do app.
+
+Gera (caminhos em config.py):
+  - GEOJSON_UF          -> propriedades: codarea, sigla
+  - GEOJSON_MUNICIPIOS  -> propriedades: codarea, nome, uf
+
+As geometrias já vêm na qualidade "mínima" do IBGE e são simplificadas
+mais uma vez para o zoom de GEOJSON_ZOOM_BASE.
+
+Uso: python tools/baixar_malhas.py
+"""
+import json
+import sys
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import config  # noqa: E402
+from map_layers import simplify_geojson  # noqa: E402
+
+MALHA_URL = (
+    "https://servicodados.ibge.gov.br/api/v3/malhas/paises/BR"
+    "?formato=application/vnd.geo%2Bjson&qualidade=minima&intrarregiao={nivel}"
+)
+MUNICIPIOS_URL = "https://servicodados.ibge.gov.br/api/v1/localidades/municipios"
+
+UF_CODIGOS = {
+    "11": "RO", "12": "AC", "13": "AM", "14": "RR", "15": "PA", "16": "AP", "17": "TO",
+    "21": "MA", "22": "PI", "23": "CE", "24": "RN", "25": "PB", "26": "PE", "27": "AL",
+    "28": "SE", "29": "BA", "31": "MG", "32": "ES", "33": "RJ", "35": "SP",
+    "41": "PR", "42": "SC", "43": "RS", "50": "MS", "51": "MT", "52": "GO", "53": "DF",
+}
+
+
+def _get_json(url: str):
+    with urllib.request.urlopen(url, timeout=120) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def _salvar(gj: dict, path: str) -> None:
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    gj = simplify_geojson(gj, config.GEOJSON_ZOOM_BASE)
+    p.write_text(json.dumps(gj, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    print(f"OK! {len(gj['features'])} áreas salvas em {p} ({p.stat().st_size / 1024:.0f} KB)")
+
+
+def main():
+    ufs = _get_json(MALHA_URL.format(nivel="UF"))
+    for f in ufs["features"]:
+        cod = str(f["properties"]["codarea"])
+        f["properties"] = {"codarea": cod, config.GEOJSON_UF_PROP: UF_CODIGOS.get(cod[:2], "")}
+    _salvar(ufs, config.GEOJSON_UF)
+
+    info = {}
+    for mun in _get_json(MUNICIPIOS_URL):
+        # alguns municípios novos vêm sem microrregião; região imediata sempre existe
+        uf = ((mun.get("microrregiao") or {}).get("mesorregiao") or {}).get("UF")
+        if not uf:
+            uf = mun["regiao-imediata"]["regiao-intermediaria"]["UF"]
+        info[str(mun["id"])] = (mun["nome"], uf["sigla"])
+
+    muns = _get_json(MALHA_URL.format(nivel="municipio"))
+    for f in muns["features"]:
+        cod = str(f["properties"]["codarea"])
+        nome, uf = info.get(cod, ("", UF_CODIGOS.get(cod[:2], "")))
+        f["properties"] = {
+            "codarea": cod,
+            config.GEOJSON_MUN_NOME_PROP: nome,
+            config.GEOJSON_MUN_UF_PROP: uf,
+        }
+    _salvar(muns, config.GEOJSON_MUNICIPIOS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Teste de carga do app: simula N sessões simultâneas mudando filtros.
+
+Roda 100% offline: gera uma planilha e um cidades.csv sintéticos numa pasta
+temporária, aponta o config para eles e troca o geocoder por um stub.
+Cada sessão é um AppTest (mesmo processo, como o servidor do Streamlit).
+
+Mede a latência de cada rerun (p50/p95), a vazão (reruns/s) e o pico de RSS.
+
+Uso: python tools/load_test.py --sessoes 8 --passos 20 --linhas 5000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import config  # noqa: E402
+import geo  # noqa: E402
+from data_loader import peak_rss_bytes  # noqa: E402
+
+UFS = ["AC", "AL", "AM", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA",
+       "PB", "PE", "PI", "PR", "RJ", "RN", "RO", "RS", "SC", "SE", "SP", "TO"]
+VENDEDORES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio"]
+
+
+class _GeocoderStub:
+    """Substitui o Nominatim: nunca acessa a rede."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def geocode(self, query):
+        return None
+
+
+def _permitir_sessoes_concorrentes() -> None:
+    """
+    O AppTest troca o Runtime global a cada run e o zera no fim; com várias
+    sessões em paralelo, uma derruba a outra ("Runtime hasn't been created").
+    Aqui Runtime.instance() passa a devolver o último runtime ativo.
+    """
+    from streamlit.runtime import Runtime
+
+    ultimo = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            ultimo["rt"] = cls._instance
+            return cls._instance
+        if "rt" in ultimo:
+            return ultimo["rt"]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    Runtime.instance = classmethod(instance)
+
+
+def gerar_dados(pasta: Path, linhas: int, n_cidades: int, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+
+    cidades = pd.DataFrame({
+        "cidade": [f"Cidade {i}" for i in range(n_cidades)],
+        "uf": rng.choice(UFS, n_cidades),
+        "lat": rng.uniform(-33.0, 4.0, n_cidades).round(4),
+        "lon": rng.uniform(-73.0, -35.0, n_cidades).round(4),
+    })
+    cidades.to_csv(pasta / "cidades.csv", index=False)
+
+    rotulos = (cidades["cidade"] + "/" + cidades["uf"]).to_numpy()
+    atendidas = []
+    for _ in range(linhas):
+        sel = rng.choice(n_cidades, rng.integers(1, 6), replace=False)
+        atendidas.append("; ".join(
+            f"{rotulos[j]}|{rng.integers(1, 5)}" if rng.random() < 0.3 else rotulos[j] for j in sel
+        ))
+    base = rng.integers(0, n_cidades, linhas)
+    inicio = pd.Timestamp("2018-01-01")
+
+    df = pd.DataFrame({
+        "NOME FANTASIA": [f"Provedor {i}" for i in range(linhas)],
+        "ASSINATURA CONTRATO": (inicio + pd.to_timedelta(rng.integers(0, 2500, linhas), unit="D")).strftime("%d/%m/%Y"),
+        "VENDEDOR": rng.choice(VENDEDORES, linhas),
+        "UF": cidades["uf"].to_numpy()[base],
+        "CIDADE": cidades["cidade"].to_numpy()[base],
+        "VALOR\nMENSAL": rng.integers(100, 20000, linhas).astype(float),
+        "STATUS": "ATIVO",
+        "CIDADES_ATENDIDAS": atendidas,
+    })
+    df.to_excel(pasta / "planilha.xlsx", index=False)
+
+
+def _widget(lista, label):
+    for w in lista:
+        if w.label == label:
+            return w
+    return None
+
+
+def _acao(at, rng: random.Random) -> str:
+    """Aplica uma mudança de filtro realista na sessão (sem rodar)."""
+    acoes = ["vendedor", "busca", "uf_atendida", "zoom", "modo", "limpar"]
+    acao = rng.choice(acoes)
+
+    if acao == "vendedor":
+        w = _widget(at.multiselect, "VENDEDOR")
+        if w is not None and w.options:
+            w.set_value(rng.sample(list(w.options), rng.randint(1, min(2, len(w.options)))))
+    elif acao == "busca":
+        at.text_input[0].set_value(f"Provedor {rng.randint(1, 9)}")
+    elif acao == "uf_atendida":
+        w = _widget(at.multiselect, "UF atendida")
+        if w is not None and w.options:
+            w.set_value([rng.choice(list(w.options))])
+    elif acao == "zoom":
+        w = _widget(at.slider, "Zoom inicial")
+        if w is not None:
+            w.set_value(rng.randint(3, 8))
+    elif acao == "modo":
+        w = _widget(at.radio, "Mostrar bolinhas por:")
+        if w is not None:
+            w.set_value(rng.choice(list(w.options)))
+    else:
+        for label in ("VENDEDOR", "UF atendida"):
+            w = _widget(at.multiselect, label)
+            if w is not None:
+                w.set_value([])
+        at.text_input[0].set_value("")
+    return acao
+
+
+def sessao(idx: int, passos: int, seed: int, timeout: float) -> list:
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed + idx)
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=timeout)
+
+    tempos = []
+    t0 = time.perf_counter()
+    at.run()
+    tempos.append(("inicial", time.perf_counter() - t0, bool(at.exception)))
+
+    for _ in range(passos):
+        acao = _acao(at, rng)
+        t0 = time.perf_counter()
+        at.run()
+        tempos.append((acao, time.perf_counter() - t0, bool(at.exception)))
+    return tempos
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessoes", type=int, default=4, help="sessões simultâneas")
+    ap.add_argument("--passos", type=int, default=10, help="mudanças de filtro por sessão")
+    ap.add_argument("--linhas", type=int, default=2000, help="clientes na planilha sintética")
+    ap.add_argument("--cidades", type=int, default=500, help="cidades no cidades.csv sintético")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--timeout", type=float, default=120.0, help="timeout (s) de cada rerun")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="heatmap_load_") as tmp:
+        pasta = Path(tmp)
+        gerar_dados(pasta, args.linhas, args.cidades, args.seed)
+
+        # aponta o app para os dados sintéticos e desliga a rede
+        config.DEFAULT_SPREADSHEET_PATH = str(pasta / "planilha.xlsx")
+        config.CIDADES_CSV = str(pasta / "cidades.csv")
+        config.CIDADES_CACHE_CSV = str(pasta / "cidades_cache.csv")
+        config.SNAPSHOT_DIR = str(pasta / ".snapshot")
+        geo.Nominatim = _GeocoderStub
+        _permitir_sessoes_concorrentes()
+
+        # o app grava mapa.html no diretório atual: mantém fora do repositório
+        cwd = os.getcwd()
+        os.chdir(pasta)
+        try:
+            print(f"Sessões: {args.sessoes} | passos: {args.passos} | linhas: {args.linhas}")
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.sessoes) as pool:
+                resultados = list(pool.map(
+                    lambda i: sessao(i, args.passos, args.seed, args.timeout), range(args.sessoes)
+                ))
+            total = time.perf_counter() - inicio
+        finally:
+            os.chdir(cwd)
+
+    tempos = [t for r in resultados for t in r]
+    lat = np.array([t[1] for t in tempos]) * 1000
+    lat_filtros = np.array([t[1] for t in tempos if t[0] != "inicial"]) * 1000
+    erros = sum(1 for t in tempos if t[2])
+
+    print(f"Reruns: {len(tempos)} | erros: {erros} | tempo total: {total:.1f}s")
+    print(f"Vazão: {len(tempos) / total:.2f} reruns/s")
+    print(f"Latência (todos)  p50: {np.percentile(lat, 50):.0f} ms | p95: {np.percentile(lat, 95):.0f} ms")
+    if len(lat_filtros):
+        print(f"Latência (filtros) p50: {np.percentile(lat_filtros, 50):.0f} ms | p95: {np.percentile(lat_filtros, 95):.0f} ms")
+    rss = peak_rss_bytes()
+    if rss:
+        print(f"Pico RSS: {rss / 2**20:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()